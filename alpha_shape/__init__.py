@@ -3,7 +3,6 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from scipy.spatial import Delaunay
 import numpy as np
 import math
 import sys
@@ -214,6 +213,7 @@ def alpha_shape(alpha, points):
     alpha_shape_edges = {}
 
     points = np.array(points)
+    from scipy.spatial import Delaunay
     triangulation = Delaunay(points)
 
     def add_triangle(i, j, k):
@@ -270,6 +270,203 @@ def alpha_shape(alpha, points):
     return triangles, perimeter
 
 
+def _point_line_distance(points, start, end):
+    """
+    Distance from each of `points` to the line through `start` and `end`
+    """
+    d = end - start
+    length = np.hypot(d[..., 0], d[..., 1])
+    cross = d[..., 0] * (points[..., 1] - start[..., 1]) - \
+        d[..., 1] * (points[..., 0] - start[..., 0])
+    dist = np.abs(cross) / np.where(length == 0, 1, length)
+    # degenerate line, use the distance to the point
+    return np.where(
+        length == 0,
+        np.hypot(points[..., 0] - start[..., 0], points[..., 1] - start[..., 1]),
+        dist
+    )
+
+def _douglas_peucker(points, tolerance):
+    """
+    Returns a mask of the points of the open polyline `points` to keep.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dist = _point_line_distance(points[first+1:last], points[first], points[last])
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+def simplify_path(path, tolerance):
+    """
+    Simplify the closed path `path` so that no point moves more than
+    `tolerance`. Repeated points and runs of collinear points are merged
+    first, then the Douglas-Peucker algorithm removes points that are within
+    `tolerance` of the simplified path.
+
+    Returns the simplified path as a list of `[x, y]` points.
+    """
+    points = np.array(path, dtype=float)
+    collinear_epsilon = 1e-9
+
+    # remove repeated points
+    step = np.roll(points, -1, axis=0) - points
+    points = points[np.hypot(step[:, 0], step[:, 1]) > collinear_epsilon]
+
+    # merge collinear runs, a point between two collinear points is also on
+    # the line between their neighbours, so they can all be removed at once
+    if len(points) > 3:
+        prev_points = np.roll(points, 1, axis=0)
+        next_points = np.roll(points, -1, axis=0)
+        dist = _point_line_distance(points, prev_points, next_points)
+        collinear = dist <= collinear_epsilon
+        if np.count_nonzero(~collinear) >= 3:
+            points = points[~collinear]
+
+    if tolerance <= 0 or len(points) <= 3:
+        return points.tolist()
+
+    # split the closed path at the point furthest from the start
+    delta = points - points[0]
+    far = int(np.argmax(np.hypot(delta[:, 0], delta[:, 1])))
+    closed = np.concatenate([points, points[:1]])
+    keep = np.concatenate([
+        _douglas_peucker(closed[:far+1], tolerance)[:-1],
+        _douglas_peucker(closed[far:], tolerance)[:-1],
+    ])
+    if np.count_nonzero(keep) < 3:
+        return points.tolist()
+    return points[keep].tolist()
+
+def _circle_from_points(p0, p1, p2):
+    """ Returns (center, radius) of the circle through three points """
+    d = 2 * (p0[0]*(p1[1] - p2[1]) + p1[0]*(p2[1] - p0[1]) + p2[0]*(p0[1] - p1[1]))
+    if abs(d) < 1e-12:
+        return None, math.inf
+    s0 = p0[0]**2 + p0[1]**2
+    s1 = p1[0]**2 + p1[1]**2
+    s2 = p2[0]**2 + p2[1]**2
+    center = np.array([
+        (s0*(p1[1] - p2[1]) + s1*(p2[1] - p0[1]) + s2*(p0[1] - p1[1])) / d,
+        (s0*(p2[0] - p1[0]) + s1*(p0[0] - p2[0]) + s2*(p1[0] - p0[0])) / d,
+    ])
+    return center, np.linalg.norm(p0 - center)
+
+def _fits_arc(points, tolerance):
+    """
+    Returns the center of the arc through `points` if the segments between
+    them are within `tolerance` of it, otherwise None.
+    """
+    center, radius = _circle_from_points(points[0], points[len(points)//2], points[-1])
+    if center is None:
+        return None
+    dist = np.hypot(points[:, 0] - center[0], points[:, 1] - center[1])
+    if np.max(np.abs(dist - radius)) > tolerance:
+        return None
+    # The middle of each straight segment is inside the arc by its sagitta,
+    # r*(1 - cos(theta/2)), which grows with the length of the segment.
+    half_chord = np.hypot(*(points[1:] - points[:-1]).T) / 2
+    half_chord = np.minimum(half_chord, radius)
+    sagitta = radius - np.sqrt(radius**2 - half_chord**2)
+    if np.max(sagitta) > tolerance:
+        return None
+    return center
+
+def _sweep_angle(center, points):
+    """ Signed angle in degrees swept by `points` around `center` """
+    v = points - center
+    cross = v[:-1, 0]*v[1:, 1] - v[:-1, 1]*v[1:, 0]
+    dot = v[:-1, 0]*v[1:, 0] + v[:-1, 1]*v[1:, 1]
+    return math.degrees(np.sum(np.arctan2(cross, dot)))
+
+def fit_arcs(path, tolerance, max_turn=30.0, min_segments=3):
+    """
+    Replace runs of short segments of the closed path `path` that lie on a
+    circle with arcs.
+
+    A run must have at least `min_segments` segments, turn in the same
+    direction at each point by at most `max_turn` degrees, and its points and
+    the middles of its segments must be within `tolerance` of the fitted
+    circle. Sharp corners are never part of an arc.
+
+    Returns a list of `("line", start, end)` and `("arc", center, start,
+    angle)` tuples, where `angle` is the signed angle in degrees swept from
+    `start` around `center`.
+    """
+    points = np.array(path, dtype=float)
+    n = len(points)
+    if tolerance <= 0 or n < min_segments + 1:
+        return [
+            ("line", points[i].tolist(), points[(i+1) % n].tolist())
+            for i in range(n)
+        ]
+
+    # signed turning angle at each point
+    v_in = points - np.roll(points, 1, axis=0)
+    v_out = np.roll(points, -1, axis=0) - points
+    turn = np.degrees(np.arctan2(
+        v_in[:, 0]*v_out[:, 1] - v_in[:, 1]*v_out[:, 0],
+        v_in[:, 0]*v_out[:, 0] + v_in[:, 1]*v_out[:, 1]
+    ))
+    smooth = np.abs(turn) <= max_turn
+
+    # start at a sharp corner, or else at the longest segment, so that no
+    # arc wraps around the start
+    corners = np.nonzero(~smooth)[0]
+    if len(corners):
+        first = int(corners[0])
+    else:
+        first = int(np.argmax(np.hypot(v_out[:, 0], v_out[:, 1])))
+    order = (np.arange(n + 1) + first) % n
+    points = points[order]
+    turn = turn[order]
+    smooth = smooth[order]
+
+    result = []
+    result_starts = []
+    i = 0
+    while i < n:
+        result_starts.append(order[i])
+        # extend the run while the interior points turn smoothly in the
+        # same direction and still fit a circle
+        best = None
+        j = i + 1
+        while j < n and smooth[j] and turn[j] != 0 and \
+                (j == i + 1 or np.sign(turn[j]) == np.sign(turn[i+1])):
+            j += 1
+            if j - i >= min_segments:
+                center = _fits_arc(points[i:j+1], tolerance)
+                if center is None:
+                    break
+                best = (j, center)
+        if best:
+            (j, center) = best
+            result.append((
+                "arc",
+                center.tolist(),
+                points[i].tolist(),
+                _sweep_angle(center, points[i:j+1])
+            ))
+            i = j
+        else:
+            result.append(("line", points[i].tolist(), points[i+1].tolist()))
+            i += 1
+
+    # keep the original start point if it wasn't merged into an arc
+    if 0 in result_starts:
+        k = result_starts.index(0)
+        result = result[k:] + result[:k]
+    return result
+
 def draw_tris(triangles, points, perimeter, alpha = None):
     import matplotlib.pyplot as plt
     from matplotlib.collections import LineCollection
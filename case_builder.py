@@ -0,0 +1,730 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Build the 3D case and lid of a keyboard as OpenSCAD objects.
+
+This module is only imported when a case, lid or parts file is generated,
+as loading SolidPython takes longer than the rest of a PCB only run.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from solid import *
+from solid.utils import *
+
+import io
+import math
+import os
+import sys
+
+import features
+import scad_cost
+import scad_tree
+import scad_writer
+import tessellation
+from key_geometry import CLIP_W, CLIP_H, CLIP_DEPTH, CLIP_SPACE
+
+script_path = os.path.dirname(os.path.abspath(__file__))
+
+# segment settings used by --fast
+FAST_CHORD_TOLERANCE = 0.25
+FAST_SEGMENTS = 12
+
+def switch_hole_local(thickness, spacing=19.0, hole_size=14.0, hole_extra=0.0,
+                      clip_notches=True):
+    # switch hole
+    switch_w = hole_size
+    switch_h = hole_size
+    main_switch_hole = translate([0, 0, -hole_extra/2])(
+        cube([switch_w, switch_h, thickness + hole_extra])
+    )
+    if hole_extra != 0.0:
+        offset = -( spacing - hole_size) / 2
+        main_switch_hole += translate([offset, offset, thickness-0.01])(
+            cube([spacing, spacing, 3])
+        )
+
+
+    if not clip_notches:
+        return [main_switch_hole]
+
+    # clip hole
+    clip_w = CLIP_W
+    clip_h = CLIP_H
+    clip_depth = CLIP_DEPTH
+    clip_hole = cube([clip_w, clip_depth, clip_h])
+
+    top_plate_offset = 1.3
+    clip_space = CLIP_SPACE
+
+    clip0_x = switch_w / 2 - clip_space / 2 - clip_w
+    clip0_y = -clip_depth
+    clip1_x = switch_w / 2 + clip_space / 2
+    clip1_y = clip0_y
+
+    clip2_x = clip0_x
+    clip2_y = switch_h
+    clip3_x = clip1_x
+    clip3_y = clip2_y
+
+    # main_switch_hole = translate([0, clip_depth, 0])(main_switch_hole)
+    z = thickness - clip_h - top_plate_offset
+    # z = thickness + clip_h + top_offset
+
+    clip_0 = translate([clip0_x, clip0_y, z])(clip_hole)
+    clip_1 = translate([clip1_x, clip1_y, z])(clip_hole)
+    clip_2 = translate([clip2_x, clip2_y, z])(clip_hole)
+    clip_3 = translate([clip3_x, clip3_y, z])(clip_hole)
+
+    # combinded = union()(main_switch_hole, clip_0, clip_1, clip_2, clip_3)
+
+    # return scale([1, 1, 1+epsilon])(combinded)
+    return [main_switch_hole, clip_0, clip_1, clip_2, clip_3]
+
+
+def create_switch_hole(pos_x, pos_y, angle, thickness, spacing=19.0, hole_size=14.0,
+                hole_extra=0.0, clip_notches=True):
+    switch_hole = switch_hole_local(
+        thickness + 0,
+        spacing=spacing,
+        hole_size=hole_size,
+        hole_extra=hole_extra,
+        clip_notches=clip_notches
+    )
+    return translate([pos_x, pos_y, -0])(rotate([0, 0, angle])(
+        translate([-hole_size/2, -hole_size/2, 0])(switch_hole)))
+
+def create_hex_hole(pos_x, pos_y, size, thickness, pos_z=0.0, angle=0.0):
+
+    outside_circle_r = size / math.sqrt(3)
+    hex_hole = render()(
+        cylinder(r=outside_circle_r, h=thickness, segments=6)
+    )
+
+    return translate([pos_x, pos_y, pos_z])(
+        rotate([0, 0, angle])(
+            hex_hole
+        )
+    )
+
+def create_rect_hole(pos_x, pos_y, l, w, h, scale=[1.0, 1.0], pos_z=0.0, angle=0.0):
+    # return translate([pos_x, pos_y, pos_z + h/2])(
+    #     rotate([0, 0, angle])(
+    #         cube([l, w, h], center=True)
+    #     )
+    # )
+
+    rect = linear_extrude(height = h, scale=scale, center=True)(
+        square([l, w], center=True)
+    )
+
+    if scale[0] < 0:
+        rect = mirror([0, 0, 1])( rect )
+        scale[0] *= -1
+    if scale[1] < 0:
+        rect = mirror([0, 0, 1])( rect )
+        scale[1] *= -1
+
+
+    return translate([pos_x, pos_y, pos_z + h/2])(
+        rotate([0, 0, angle])(
+            rect
+        )
+    )
+
+
+
+class ScadVariable(object):
+    """ A reference to an OpenSCAD variable in the parameters of an object """
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+def for_each_position(positions):
+    """
+    Returns an OpenSCAD for loop that places its children at each `[x, y, r]`
+    in `positions`, rotating them by `r` degrees about the z axis.
+    """
+    def wrap(obj):
+        loop = OpenSCADObject("for", {"p": positions})
+        return loop(
+            translate([ScadVariable("p[0]"), ScadVariable("p[1]"), 0])(
+                rotate([0, 0, ScadVariable("p[2]")])(
+                    obj
+                )
+            )
+        )
+    return wrap
+
+class ScadModules(object):
+    """
+    Objects that are placed many times are written once as OpenSCAD modules
+    in the file header, and placed with a for loop that calls the module.
+    """
+    def __init__(self, uses=None):
+        self.uses = uses if uses != None else []
+        self.modules = []
+
+    def define(self, name, obj):
+        self.modules.append((name, obj))
+
+    def place(self, name, positions):
+        """ Returns a loop calling module `name` at each `[x, y, r]` """
+        return for_each_position(positions)(OpenSCADObject(name, {}))
+
+    def get_header(self):
+        # the module bodies aren't part of the rendered tree, so the files
+        # they use must be listed here
+        out = io.StringIO()
+        for path in self.uses:
+            out.write("use <{}>\n".format(path))
+        writer = scad_writer.ScadWriter(out)
+        for (name, obj) in self.modules:
+            writer.write_module(name, scad_tree.optimize(obj))
+        return out.getvalue()
+
+SCREW_SEGMENTS = 20
+
+def create_screw_hole(pos_x, pos_y, radius, thickness, pos_z=0, segments=SCREW_SEGMENTS):
+
+    screw_hole = render()(
+        cylinder(r=radius, h=thickness, segments=segments)
+    )
+
+    return translate([pos_x, pos_y, pos_z])(
+        screw_hole
+    )
+
+class HoleBuilder(object):
+    def __init__(self, top_plate_thickness=5.0, pcb_thickness=1.6, budget=None):
+        self.top_plate_thickness = top_plate_thickness
+        self.pcb_thickness = pcb_thickness
+        if budget == None:
+            budget = tessellation.TessellationBudget()
+        self.budget = budget
+
+    def create_usb_c_hole(self, pos_x, pos_y, pos_z=0, flip=False, count=1):
+        l = 9.5
+        w = 3.6
+        h = 10
+        corner_raidus = 0.8
+        segs = self.budget.segments(corner_raidus, count)
+
+        port_hole = render()(
+            rotate([-90, 0, 0])(
+                linear_extrude(height=h, center=True)(
+                    rounding(r=corner_raidus, segments=segs)(
+                        square([l, w], center=True)
+                    )
+                )
+            )
+        )
+
+
+        z_offset = -self.pcb_thickness - w/2
+        if flip:
+            z_offset = +w/2
+
+        return translate([pos_x, pos_y, pos_z + z_offset])(
+            port_hole
+        )
+
+class OpenSCADObjectBuilder(object):
+    def __init__(self, obj=None):
+        self.add_list = []
+        self.del_list = []
+        if obj:
+            self.add_list.append(obj)
+
+    def __add__(self, other):
+        self.add_list.append(other)
+        return self
+
+    def __sub__(self, other):
+        self.del_list.append(other)
+        return self
+
+    def generate(self):
+        return union()(self.add_list) - self.del_list
+
+class CaseBuilder(object):
+    """
+    Builds the case and the lid of the keyboard of `keyboard`, a
+    `plate.KeyboardBuilder`. Only the parts named in `parts`, 'case' and
+    'lid', are built.
+    """
+
+    def __init__(self, keyboard, parts=('case', 'lid')):
+        self.keyboard = keyboard
+        self.opt = keyboard.opt
+        self.timer = keyboard.timer
+        self.parts = parts
+
+        scad_morphology_path = "%s/%s"%(script_path, os.path.join("scad-utils", "morphology.scad"))
+        use(scad_morphology_path)
+        self.scad_modules = ScadModules(uses=[scad_morphology_path])
+        if self.opt.fast:
+            self.segment_budget = tessellation.TessellationBudget(
+                tolerance = max(self.opt.chord_tolerance, FAST_CHORD_TOLERANCE),
+                max_segments = min(self.opt.segments, FAST_SEGMENTS),
+                max_facets = self.opt.max_facets,
+            )
+        else:
+            self.segment_budget = tessellation.TessellationBudget(
+                tolerance = self.opt.chord_tolerance,
+                max_segments = self.opt.segments,
+                max_facets = self.opt.max_facets,
+            )
+        self.hole_builder = HoleBuilder(
+            top_plate_thickness = self.opt.top_thickness,
+            pcb_thickness = self.opt.pcb_thickness,
+            budget = self.segment_budget,
+        )
+
+        self.case = OpenSCADObjectBuilder()
+        self.lid = OpenSCADObjectBuilder()
+
+    def create_rounded_slab(self, path, thickness, radius, sphere_module):
+        """
+        Returns a slab from z=0 to z=`thickness` with the outline of `path`
+        grown by `radius`, and all its edges rounded with `radius`.
+        `sphere_module` is the name of a module with a sphere of `radius`.
+
+        This is the minkowski sum of a sphere and the extruded `path`, but
+        built as the extruded `path` and a hull of four spheres along each of
+        its edges. These are all convex, which CGAL handles much faster.
+        """
+        pieces = [linear_extrude(thickness)(polygon(points=path))]
+        for (i, point) in enumerate(path):
+            last_point = path[i-1]
+            if last_point == point:
+                continue
+            pieces.append(hull()([
+                translate([x, y, z])(OpenSCADObject(sphere_module, {}))
+                for (x, y) in (last_point, point)
+                for z in (radius, thickness - radius)
+            ]))
+        return union()(pieces)
+
+    def create_case_body(self, case_path, margin_path, pcb_un_inset_path):
+        """
+        Add the plate and the bottom of the case, with the cavities for the
+        PCB and the lid, to the case and make the lid. `margin_path` is
+        `case_path` grown by `--margin`.
+        """
+        top_thickness = self.opt.top_thickness
+        bot_thickness = self.opt.bot_thickness
+        outline_poly = polygon(points=case_path)
+        case_outline = None
+
+        if self.opt.corner_type == "spherical":
+            corner_raidus = min(1.5, top_thickness / 2)
+            core_path = self.keyboard.inset_path(margin_path, corner_raidus)
+            self.scad_modules.define("corner_sphere", sphere(
+                r = corner_raidus,
+                segments = self.segment_budget.segments(
+                    corner_raidus, count=len(core_path), sphere=True
+                )
+            ))
+            if self.opt.fast:
+                # the outline without rounded edges
+                if self.opt.plate_only:
+                    top_plate = linear_extrude(top_thickness)(
+                        polygon(points=margin_path)
+                    )
+                else:
+                    top_plate = translate([0, 0, -bot_thickness])(
+                        linear_extrude(top_thickness + bot_thickness)(
+                            polygon(points=margin_path)
+                        )
+                    )
+            elif self.opt.plate_only:
+                top_plate = self.create_rounded_slab(
+                    core_path, top_thickness, corner_raidus, "corner_sphere"
+                )
+            else:
+                # the plate and the bottom of the case are a single slab
+                top_plate = translate([0, 0, -bot_thickness])(
+                    self.create_rounded_slab(
+                        core_path, top_thickness + bot_thickness, corner_raidus,
+                        "corner_sphere"
+                    )
+                )
+            bot_case = None
+            if self.opt.fast:
+                case_outline = polygon(points=margin_path)
+            else:
+                case_outline = outset(
+                    d = corner_raidus,
+                    segments = self.segment_budget.segments(corner_raidus, len(core_path))
+                )(polygon(points=core_path))
+        elif self.opt.corner_type == "cylinder":
+            corner_raidus = 3
+            # the fillet and the rounding each round about a quarter circle
+            # at every corner of the outline
+            segs = self.segment_budget.segments(
+                corner_raidus, count=max(1, len(case_path) // 2)
+            )
+            if self.opt.margin < 0:
+                case_outline_poly = inset(d=-self.opt.margin)(outline_poly)
+            elif self.opt.margin > 0:
+                case_outline_poly = outset(d=self.opt.margin)(outline_poly)
+            else:
+                case_outline_poly = outline_poly
+            if self.opt.fast:
+                case_outline = case_outline_poly
+            else:
+                case_outline = fillet(r=corner_raidus, segments=segs)(
+                    rounding(r=corner_raidus, segments=segs)(
+                        case_outline_poly
+                    )
+                )
+        elif self.opt.corner_type == "rectangular":
+            case_outline = outline_poly
+
+        if self.opt.corner_type in ["cylinder", "rectangular"]:
+            top_plate = linear_extrude(top_thickness)(case_outline)
+            bot_case = translate([0, 0, -bot_thickness])(
+                linear_extrude(bot_thickness)(case_outline)
+            )
+
+        lid_cutout_inset = 2.5-self.opt.pcb_tolerance
+        corners = max(1, len(case_path) // 4)
+        lid_cutout_outline = inset(
+            d = lid_cutout_inset,
+            segments = self.segment_budget.segments(lid_cutout_inset, corners)
+        )(case_outline)
+        lid_inset = lid_cutout_inset+self.opt.lid_tolerance
+        lid_outline = inset(
+            d = lid_inset,
+            segments = self.segment_budget.segments(lid_inset, corners)
+        )(case_outline)
+        self.lid += linear_extrude(self.opt.lid_thickness)(lid_outline)
+        lid_cutout = linear_extrude(self.opt.lid_thickness)(lid_cutout_outline)
+
+        pcb_edge = (self.opt.spacing - self.opt.switch_hole_size) / 2
+        pcb_inset_outset = -pcb_edge + self.opt.pcb_margin + self.opt.pcb_tolerance
+        if pcb_inset_outset < 0:
+            pcb_cutout = inset(-pcb_inset_outset)(
+                polygon(pcb_un_inset_path)
+            )
+        elif pcb_inset_outset > 0:
+            pcb_cutout = outset(pcb_inset_outset)(
+                polygon(pcb_un_inset_path)
+            )
+        elif pcb_inset_outset == 0:
+            pcb_cutout = polygon(pcb_un_inset_path)
+
+        bot_case_cavity = translate([0, 0, -bot_thickness])(
+            linear_extrude(bot_thickness+self.opt.pcb_tolerance_z)(
+                pcb_cutout
+            )
+        ) + translate([0, 0, -bot_thickness])(
+            lid_cutout
+        )
+
+
+#         if 0:
+#             # # bottom case cavity
+#             safety_margin = 0.5
+#             safety_margin = 1.5
+#             gap_size = spacing - hole_size - safety_margin
+#             bot_x = -margin/2 + gap_size/2
+#             bot_y = -margin/2 + gap_size/2
+#             bot_size_x = size_x - gap_size
+#             bot_size_y = size_y - gap_size
+#             bot_case_cavity = translate([bot_x, bot_y, -bot_thickness])(
+#                 cube([bot_size_x, bot_size_y, bot_thickness])
+#             )
+
+        # take cavity out of botcase
+        body = None
+        if self.opt.plate_only:
+            body = top_plate
+        else:
+            if self.opt.corner_type == "spherical":
+                body = top_plate - bot_case_cavity
+            else:
+                body = (top_plate + bot_case) - bot_case_cavity
+
+        self.case += body
+
+    def add_switches(self, switch_positions, strut_positions):
+        """
+        Cut the switch holes at each `[x, y, angle]` in `switch_positions`
+        out of the case, and add a lid strut at each of `strut_positions`.
+        """
+        top_thickness = self.opt.top_thickness
+        hole_size = self.opt.switch_hole_size
+
+        # Create the holes for the key switches
+        if switch_positions and 'case' in self.parts:
+            self.scad_modules.define("switch_hole", create_switch_hole(
+                0, 0, 0, top_thickness, hole_size=hole_size,
+                clip_notches = not self.opt.fast
+            ))
+            self.case -= self.scad_modules.place("switch_hole", switch_positions)
+
+        if strut_positions and 'lid' in self.parts:
+            # height of switch plate affects the bottom position of the
+            # stem relative to the lid.
+            bot_of_stem_offset = self.opt.top_thickness - 5
+            mx_leg_h = 3.3
+            # height from bottom of lid, to bottom of switch stem
+            strut_h = bot_of_stem_offset + self.opt.bot_thickness - mx_leg_h
+            strut_height_adjust = self.opt.strut_height_adjust
+            strut_h += strut_height_adjust
+            strut_segments = self.segment_budget.segments(10/2, len(strut_positions))
+            self.scad_modules.define("lid_strut",
+                cylinder(r1 = 10/2, r2 = 5/2, h=strut_h, segments=strut_segments)
+            )
+            self.lid += self.scad_modules.place("lid_strut", strut_positions)
+
+    def generate(self):
+        """
+        Returns the OpenSCAD objects `(case, lid)`, None for the parts that
+        weren't built.
+        """
+        case = lid = None
+        if 'case' in self.parts:
+            case = scad_tree.optimize(mirror([0, 1, 0])(self.case.generate()))
+        if 'lid' in self.parts:
+            lid = scad_tree.optimize(mirror([0, 1, 0])(self.lid.generate()))
+        self.timer.mark("optimize")
+        return (case, lid)
+
+    def animate(self, case, lid, file_name):
+        def _animate(_time=0):
+            t = _time * 2
+            parts = part()(
+                part()(color("yellow")(case)),
+                translate([0, 0, -(self.opt.bot_thickness + (7)*t)])(
+                    part()(color("red")(lid))
+                )
+            )
+
+            return parts
+
+        scad_render_animated_file(
+            _animate,
+            steps=60,   # Number of steps to create one complete motion
+            back_and_forth=True,
+            file_header=self.scad_modules.get_header(),
+            filepath=file_name
+        )
+
+    def add_scad_features(self, table):
+        """
+        Add the features in the compiled feature table `table` to the case
+        and the lid, leaving out the ones for parts that aren't built. Features
+        that are used more than once, like the copies made by an array()
+        directive, are placed with a module and a for loop.
+        """
+        for (i, group) in enumerate(features.group_instances(table)):
+            rows = list(features.iter_rows(group))
+            if len(rows) == 1:
+                for (part, add, obj) in self.create_feature(rows[0], 1):
+                    if part in self.parts:
+                        self.add_to_part(part, add, obj)
+                continue
+
+            # all copies are the same apart from their position
+            template = dict(rows[0], x=0.0, y=0.0, r=0.0)
+            positions = [[row['x'], row['y'], row['r']] for row in rows]
+            objects = self.create_feature(template, len(rows))
+            for (j, (part, add, obj)) in enumerate(objects):
+                if part not in self.parts:
+                    continue
+                name = "{}_{}_{}".format(features.FEATURE_NAMES[template['kind']], i, j)
+                self.scad_modules.define(name, obj)
+                self.add_to_part(part, add, self.scad_modules.place(name, positions))
+
+    def add_to_part(self, part, add, obj):
+        builder = self.case if part == 'case' else self.lid
+        if add:
+            builder += obj
+        else:
+            builder -= obj
+
+    def create_feature(self, row, count=1):
+        """
+        Returns the OpenSCAD objects for a row of the feature table as a
+        list of `(part, add, obj)`, where `part` is 'case' or 'lid' and `add`
+        is False for holes. `count` is the number of times the objects are
+        placed, used to budget the segments of curves.
+        """
+        kind = row['kind']
+        result = []
+        if kind == features.FEATURE_HEX:
+            if row['top']:
+                result.append(('case', False, create_hex_hole(
+                    row['x'], row['y'], row['l'], row['h'], angle=row['r']
+                )))
+        elif kind == features.FEATURE_SCREW:
+            if row['top']:
+                result.append(('case', False, create_screw_hole(
+                    row['x'], row['y'],
+                    radius = row['l'] / 2,
+                    thickness = self.opt.top_thickness,
+                    segments = self.segment_budget.segments(row['l'] / 2, count),
+                )))
+            if row['lid']:
+                result += self.create_lid_screw(row, count)
+        elif kind == features.FEATURE_USB_C:
+            if row['top']:
+                result.append(('case', False, self.hole_builder.create_usb_c_hole(
+                    row['x'], row['y'],
+                    flip = row['flip'],
+                    pos_z = row['z'],
+                    count = count,
+                )))
+        elif kind == features.FEATURE_RECT:
+            # Create rectangular holes, or add material
+            rect = create_rect_hole(
+                row['x'], row['y'],
+                row['l'], row['w'], row['h'],
+                [row['scalex'], row['scaley']],
+                pos_z = row['z'],
+                angle = row['r']
+            )
+            if row['top']:
+                result.append(('case', row['add'], rect))
+            if row['lid']:
+                result.append(('lid', row['add'], rect))
+        return result
+
+    def create_lid_screw(self, row, count=1):
+        (pos_x, pos_y) = (row['x'], row['y'])
+        screw_d = row['l']
+        screw_retain_thickness = row['shaft_h']
+        screw_retain_d = row['shaft_d']
+        screw_head_h = row['head_h']
+        screw_head_d = row['head_d']
+        screw_shaft_length = max(
+            screw_retain_thickness,
+            self.opt.lid_thickness
+        )
+        # main shaft for screw hole in lid
+        result = [('lid', False, create_screw_hole(
+            pos_x, pos_y,
+            radius = screw_d / 2,
+            thickness = screw_shaft_length,
+            segments = self.segment_budget.segments(screw_d / 2, count),
+        ))]
+        if screw_head_d:
+            result.append(('lid', False, translate([pos_x, pos_y, screw_head_h])(
+                cylinder(
+                    r1 = screw_head_d/2,
+                    r2 = screw_d/2,
+                    h = (screw_retain_thickness-screw_head_h),
+                    segments = self.segment_budget.segments(screw_head_d / 2, count)
+                )
+            )))
+
+            # make inset hole for screw head in lid
+            result.append(('lid', False, create_screw_hole(
+                pos_x, pos_y,
+                radius = screw_head_d / 2,
+                thickness = screw_head_h,
+                segments = self.segment_budget.segments(screw_head_d / 2, count),
+            )))
+
+            # add extra material on the lid to retain the inset
+            # screw hole
+            result.append(('lid', True, create_screw_hole(
+                pos_x, pos_y,
+                radius = screw_retain_d / 2,
+                thickness = screw_retain_thickness,
+                segments = self.segment_budget.segments(screw_retain_d / 2, count),
+            )))
+        return result
+
+    def check_render_cost(self, objects):
+        """
+        Estimate the CGAL render cost of each `(name, obj)` in `objects`,
+        printing a warning for each one over `--render-budget`. Returns True
+        if all are within the budget.
+        """
+        modules = dict(self.scad_modules.modules)
+        result = True
+        for (name, obj) in objects:
+            cost = scad_cost.estimate_cost(obj, modules)
+            if self.opt.render_report:
+                print("Render cost of the {}:".format(name))
+                print("    " + str(cost).replace("\n", "\n    "))
+            if self.opt.render_budget and cost.cost > self.opt.render_budget:
+                print("Warning: estimated render cost of the {} is {:,.0f}, "
+                    "over the budget of {:,.0f}".format(
+                        name, cost.cost, self.opt.render_budget
+                    ),
+                    file=sys.stderr
+                )
+                result = False
+        return result
+
+    def write_files(self, file_name, artifacts, case, lid):
+        """
+        Write the .scad files in `artifacts` for the `case` and `lid` from
+        `generate()`, using `file_name` as the prefix of their names.
+        Returns the parts object with both of them, if it is written.
+        """
+        header = self.scad_modules.get_header()
+        parts = None
+        if 'parts' in artifacts:
+            parts = part()(
+                part()(color("yellow")(case)),
+                down(self.opt.bot_thickness + self.opt.lid_thickness + 7)(
+                    part()(color("red")(lid))
+                )
+            )
+        if self.opt.xcuts != None:
+            xcuts = self.opt.xcuts
+            # layout files can give the cuts as a string
+            if isinstance(xcuts, str):
+                xcuts = xcuts.split()
+            number_of_cuts = len(xcuts)
+            xcuts = ["-1000.0"] + xcuts + ["1000.0"]
+            xcuts = [float(x)*self.opt.spacing for x in xcuts]
+            number_of_segments = number_of_cuts + 1
+            for i in range(number_of_segments):
+                start_x = xcuts[i]
+                end_x = xcuts[i+1]
+                width_of_cut = end_x - start_x
+
+                part_volume = translate([start_x+width_of_cut/2, 0, 0])(
+                    cube([width_of_cut, 999999, 999999], center=True)
+                )
+
+                if 'case' in artifacts:
+                    case_part_i = intersection()(
+                        part_volume,
+                        case
+                    )
+                    scad_writer.write_file(
+                        case_part_i,
+                        "{}-case-{}.scad".format(file_name, i),
+                        header=header
+                    )
+                if 'lid' in artifacts:
+                    lid_part_i = intersection()(
+                        part_volume,
+                        lid
+                    )
+                    scad_writer.write_file(
+                        lid_part_i,
+                        "{}-lid-{}.scad".format(file_name, i),
+                        header=header
+                    )
+        if 'case' in artifacts:
+            scad_writer.write_file(case,  file_name+"-case"+".scad", header=header)
+        if 'lid' in artifacts:
+            scad_writer.write_file(lid,   file_name+"-lid"+".scad", header=header)
+        if 'parts' in artifacts:
+            scad_writer.write_file(parts, file_name+"-parts"+".scad", header=header)
+        self.timer.mark("write scad")
+        return parts
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Collision tests between 2D shapes in the board plane.
+
+Convex polygons and circles are tested with the separating axis theorem.
+Shapes that only touch are not considered to collide.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+import numpy as np
+
+EPSILON = 1e-6
+
+class Polygon(object):
+    """ A convex polygon """
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float)
+        self.center = self.points.mean(axis=0)
+        self.radius = np.linalg.norm(self.points - self.center, axis=1).max()
+
+    def project(self, axis):
+        dots = self.points.dot(axis)
+        return (dots.min(), dots.max())
+
+    def get_axes(self):
+        edges = np.roll(self.points, -1, axis=0) - self.points
+        normals = np.stack([-edges[:, 1], edges[:, 0]], axis=-1)
+        lengths = np.linalg.norm(normals, axis=1)
+        return normals[lengths > EPSILON] / lengths[lengths > EPSILON, np.newaxis]
+
+class Circle(object):
+    def __init__(self, center, radius):
+        self.center = np.asarray(center, dtype=float)
+        self.radius = radius
+
+    def project(self, axis):
+        dot = self.center.dot(axis)
+        return (dot - self.radius, dot + self.radius)
+
+def rect_polygon(x, y, l, w, angle=0.0):
+    """ A `l` by `w` rectangle centered on `(x, y)` rotated by `angle` degrees. """
+    corners = np.array([
+        [-l/2, -w/2],
+        [+l/2, -w/2],
+        [+l/2, +w/2],
+        [-l/2, +w/2],
+    ])
+    return Polygon(_rotate(corners, angle) + [x, y])
+
+def regular_polygon(x, y, radius, sides, angle=0.0):
+    """ Matches the vertices of an OpenSCAD `cylinder()` with `sides` segments """
+    theta = np.linspace(0, 2*math.pi, sides, endpoint=False)
+    corners = radius * np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+    return Polygon(_rotate(corners, angle) + [x, y])
+
+def _rotate(points, angle):
+    theta = math.radians(angle)
+    rot = np.array([
+        [math.cos(theta), -math.sin(theta)],
+        [math.sin(theta), math.cos(theta)],
+    ])
+    return points.dot(rot.T)
+
+def _overlap_on_axis(a, b, axis):
+    (a_min, a_max) = a.project(axis)
+    (b_min, b_max) = b.project(axis)
+    return a_min < b_max - EPSILON and b_min < a_max - EPSILON
+
+def shapes_intersect(a, b):
+    if isinstance(a, Circle) and isinstance(b, Circle):
+        dist = np.linalg.norm(a.center - b.center)
+        return dist < a.radius + b.radius - EPSILON
+
+    if isinstance(a, Circle):
+        (a, b) = (b, a)
+
+    axes = list(a.get_axes())
+    if isinstance(b, Polygon):
+        axes += list(b.get_axes())
+    else:
+        # the axis from the circle to the closest polygon vertex
+        delta = a.points - b.center
+        closest = delta[np.argmin(np.linalg.norm(delta, axis=1))]
+        length = np.linalg.norm(closest)
+        if length > EPSILON:
+            axes.append(closest / length)
+
+    for axis in axes:
+        if not _overlap_on_axis(a, b, axis):
+            return False
+    return True
+
+class ShapeIndex(object):
+    """
+    A KD-tree over the bounding circles of a set of shapes.
+    """
+    def __init__(self, shapes, labels):
+        self.shapes = shapes
+        self.labels = labels
+        if shapes:
+            from scipy.spatial import cKDTree
+            self.tree = cKDTree([shape.center for shape in shapes])
+            self.max_radius = max(shape.radius for shape in shapes)
+        else:
+            self.tree = None
+            self.max_radius = 0.0
+
+    def find_collisions(self, shape):
+        """ Returns the labels of all shapes that collide with `shape` """
+        if self.tree == None:
+            return []
+        candidates = self.tree.query_ball_point(
+            shape.center,
+            shape.radius + self.max_radius
+        )
+        return [
+            self.labels[i] for i in sorted(candidates)
+            if shapes_intersect(shape, self.shapes[i])
+        ]
@@ -3,7 +3,9 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import pyparsing as pp
+import functools
+import math
+import re
 
 
 class DirectiveParserError(Exception):
@@ -258,6 +260,106 @@ class USBCDirective(Directive):
             self.x, self.y, self.z, self.r, self.flip)
     __repr__ = __str__
 
+class ArrayDirective(object):
+    """
+    Repeats a child directive on a grid, hex or polar pattern. The pattern is
+    centered on where the child would be placed on its own. The child can be
+    another array.
+    """
+    KEYWORD = 'array'
+    NUM_POS_ARGS = 1
+    PATTERNS = ('grid', 'hex', 'polar')
+
+    def __init__(self, child, pattern='grid', nx=1, ny=1, dx=0, dy=None,
+                 n=1, radius=0, angle=0, sweep=360, rotate=False):
+        if not isinstance(child, (Directive, ArrayDirective)):
+            raise DirectiveParserError(
+                "Expected a directive to repeat, but got '{}'".format(child)
+            )
+        if pattern not in self.PATTERNS:
+            raise DirectiveParserError("Unknown pattern '{}', expected one "
+                "of: {}".format(pattern, ", ".join(self.PATTERNS))
+            )
+        for count in (nx, ny, n):
+            if count != int(count) or count < 1:
+                raise DirectiveParserError(
+                    "Expected a positive whole number of copies, but got "
+                    "'{}'".format(count)
+                )
+        self.child = child
+        self.pattern = pattern
+        self.nx = int(nx)
+        self.ny = int(ny)
+        self.dx = dx
+        if dy == None:
+            dy = dx * math.sqrt(3) / 2 if pattern == 'hex' else dx
+        self.dy = dy
+        self.n = int(n)
+        self.radius = radius
+        self.angle = angle
+        self.sweep = sweep
+        self.rotate = rotate
+
+    @staticmethod
+    def from_args(args):
+        Directive.check_args(ArrayDirective, args)
+        return ArrayDirective(args.positional[0], **args.keyword)
+
+    def get_offsets(self):
+        """ Returns the `(x, y, r)` offset of each copy of the child """
+        if self.pattern == 'polar':
+            if self.sweep % 360 == 0 or self.n == 1:
+                step = self.sweep / self.n
+            else:
+                # include both ends of a partial circle
+                step = self.sweep / (self.n - 1)
+            result = []
+            for i in range(self.n):
+                theta = self.angle + i * step
+                result.append((
+                    self.radius * math.cos(math.radians(theta)),
+                    self.radius * math.sin(math.radians(theta)),
+                    theta if self.rotate else 0,
+                ))
+            return result
+
+        result = []
+        for j in range(self.ny):
+            # odd rows of a hex pattern are shifted by half a column
+            shift = self.dx / 2 if self.pattern == 'hex' and j % 2 else 0
+            for i in range(self.nx):
+                result.append((i * self.dx + shift, j * self.dy, 0))
+        center_x = sum(x for (x, _, _) in result) / len(result)
+        center_y = sum(y for (_, y, _) in result) / len(result)
+        return [(x - center_x, y - center_y, r) for (x, y, r) in result]
+
+    def get_instances(self):
+        """
+        Returns `(directive, x, y, r)` for every copy of the directives at
+        the bottom of the array, with nested arrays expanded.
+        """
+        result = []
+        for (x, y, r) in self.get_offsets():
+            if isinstance(self.child, ArrayDirective):
+                children = self.child.get_instances()
+            else:
+                children = [(self.child, 0, 0, 0)]
+            theta = math.radians(r)
+            for (child, cx, cy, cr) in children:
+                result.append((
+                    child,
+                    x + cx * math.cos(theta) - cy * math.sin(theta),
+                    y + cx * math.sin(theta) + cy * math.cos(theta),
+                    r + cr,
+                ))
+        return result
+
+    def __str__(self):
+        return "ArrayDirective(child={}, pattern={}, count={})".format(
+            self.child, self.pattern, len(self.get_offsets())
+        )
+    __repr__ = __str__
+
 class StrutDirective(object):
     def __init__(self, is_used):
         self.is_used = is_used
@@ -274,23 +376,29 @@ directiveLookupTable = {
     'usb_c': USBCDirective,
     'rect': RectDirective,
     'strut': StrutDirective,
+    'array': ArrayDirective,
 }
 
 class DirectiveArgs(object):
-    def __init__(self, toks):
+    def __init__(self, positional=None, keyword=None):
+        self.positional = positional if positional != None else []
+        self.keyword = keyword if keyword != None else {}
+
+    @staticmethod
+    def from_tokens(toks):
+        import pyparsing as pp
         split_pos = 0
         for tok in toks:
             if type(tok) == pp.ParseResults:
                 break;
             split_pos += 1
-        self.positional = toks[:split_pos]
-
-        self.keyword = {}
-        keyword_list = toks[split_pos:]
 
-        for entry in keyword_list:
+        keyword = {}
+        for entry in toks[split_pos:]:
             key, value = entry[0], entry[1]
-            self.keyword[key] = value
+            keyword[key] = value
+
+        return DirectiveArgs(toks[:split_pos], keyword)
 
 
     def __str__(self):
@@ -301,6 +409,10 @@ class DirectiveArgs(object):
 
 class DirectiveParser(object):
     def __init__(self):
+        # pyparsing is slow to import and only needed for legends that the
+        # `FastDirectiveParser` can't handle
+        import pyparsing as pp
+
         # directive grammar
 
         lparen = pp.Literal('(').suppress()
@@ -339,7 +451,9 @@ class DirectiveParser(object):
             pp.Word(pp.alphas + '_', pp.alphanums + '_')
         self.posKeywordTok.addParseAction(lambda toks: str(toks[0]))
 
-        self.positionalArgTok = self.floatTok | self.stringTok | self.boolTok
+        # directives can be arguments of other directives, like array()
+        self.nestedDirectiveTok = pp.Forward()
+        self.positionalArgTok = self.nestedDirectiveTok | self.floatTok | self.stringTok | self.boolTok
         self.keywordArgTok = pp.Group(self.identifierTok + equalTok + (self.positionalArgTok | self.posKeywordTok))
         self.keywordArgTok.addParseAction(lambda toks: [x for x in toks])
 
@@ -348,26 +462,160 @@ class DirectiveParser(object):
             (self.keywordArgTok + pp.ZeroOrMore(comma + self.keywordArgTok))
         )('args')
         # self.argsTok.addParseAction(lambda toks: [toks])
-        self.argsTok.addParseAction(lambda toks: DirectiveArgs(toks))
+        self.argsTok.addParseAction(DirectiveArgs.from_tokens)
 
         self.directiveTok = pp.Group(self.identifierTok + lparen + self.argsTok + rparen)
+        self.nestedDirectiveTok <<= pp.Group(self.identifierTok + lparen + self.argsTok + rparen)
+        self.nestedDirectiveTok.addParseAction(
+            lambda toks: _create_directive(toks[0].identifier, toks[0].args)
+        )
         self.mainTok = self.directiveTok + pp.ZeroOrMore(semicolon + self.directiveTok) + pp.Optional(semicolon)
 
     def parse_str(self, input):
-        try:
-            directives = self.mainTok.parseString(input, parseAll=True)
-            result = []
-            for directive in directives:
-                if directive.identifier in directiveLookupTable:
-                    dirClass = directiveLookupTable[directive.identifier]
-                    result.append(dirClass.from_args(directive.args))
+        directives = self.mainTok.parseString(input, parseAll=True)
+        return [
+            _create_directive(directive.identifier, directive.args)
+            for directive in directives
+        ]
+
+def _create_directive(identifier, args):
+    if identifier in directiveLookupTable:
+        dirClass = directiveLookupTable[identifier]
+        return dirClass.from_args(args)
+    else:
+        raise DirectiveTypeError(identifier)
+
+# Tokens understood by `FastDirectiveParser`. Anything else, like escaped
+# quotes, is left to the pyparsing grammar.
+_FAST_TOKEN_RE = re.compile(r"""
+    [ \t\r\n]*(?:
+        (?P<float>[-+]?[0-9]+(?:\.[0-9]*)?)(?![A-Za-z0-9_.])
+        | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+        | "(?P<dstr>[^"'\\\r\n]*)"
+        | '(?P<sstr>[^"'\\\r\n]*)'
+        | (?P<punct>[(),;=])
+    )""", re.VERBOSE)
+
+class FastDirectiveParser(object):
+    """
+    A hand written parser for the common `name(args); ...` directive forms.
+
+    It accepts a subset of the `DirectiveParser` grammar and returns None for
+    anything it doesn't understand, including errors. The result is the same
+    as `DirectiveParser` for every input it accepts.
+    """
+
+    def tokenize(self, text):
+        tokens = []
+        pos = 0
+        end = len(text.rstrip(" \t\r\n"))
+        while pos < end:
+            match = _FAST_TOKEN_RE.match(text, pos)
+            if not match:
+                return None
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "float":
+                value = float(value)
+            elif kind == "dstr" or kind == "sstr":
+                kind = "str"
+            elif kind == "ident" and value in ("true", "false"):
+                kind = "bool"
+                value = (value == "true")
+            tokens.append((kind, value))
+            pos = match.end()
+        return tokens
+
+    def parse_str(self, text):
+        tokens = self.tokenize(text)
+        if not tokens:
+            return None
+
+        result = []
+        i = 0
+        while i < len(tokens):
+            # name (
+            if tokens[i][0] != "ident" or i+1 >= len(tokens) or \
+                    tokens[i+1] != ("punct", "("):
+                return None
+            identifier = tokens[i][1]
+            i += 2
+
+            positional = []
+            keyword = {}
+            expect_arg = True
+            while i < len(tokens) and tokens[i] != ("punct", ")"):
+                if not expect_arg:
+                    if tokens[i] != ("punct", ","):
+                        return None
+                    i += 1
+                    expect_arg = True
+                    continue
+                (kind, value) = tokens[i]
+                if kind == "ident" and i+2 < len(tokens) and \
+                        tokens[i+1] == ("punct", "="):
+                    (arg_kind, arg_value) = tokens[i+2]
+                    if arg_kind == "punct":
+                        return None
+                    keyword[value] = arg_value
+                    i += 3
+                elif kind in ("float", "str", "bool") and not keyword:
+                    positional.append(value)
+                    i += 1
                 else:
-                    raise DirectiveTypeError(directive.identifier)
-            return result
-        except pp.ParseException as err:
-            raise err
+                    return None
+                expect_arg = False
+            if i >= len(tokens) or (positional or keyword) and expect_arg:
+                # missing ')' or trailing ','
+                return None
+            i += 1
+
+            result.append((identifier, DirectiveArgs(positional, keyword)))
+
+            # ; between directives, and an optional one at the end
+            if i < len(tokens):
+                if tokens[i] != ("punct", ";"):
+                    return None
+                i += 1
+        return [_create_directive(identifier, args) for (identifier, args) in result]
+
+# Legends without a `name(` can't contain a directive
+_MAYBE_DIRECTIVE_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\s*\(")
+
+_parser = None
+_fast_parser = FastDirectiveParser()
+
+def get_parser():
+    """ Returns the shared `DirectiveParser` """
+    global _parser
+    if _parser == None:
+        _parser = DirectiveParser()
+    return _parser
+
+@functools.lru_cache(maxsize=1024)
+def _parse_legend_cached(legend):
+    if not _MAYBE_DIRECTIVE_RE.search(legend):
+        return ()
+    result = _fast_parser.parse_str(legend)
+    if result == None:
+        # the pyparsing grammar gives better error messages
+        result = get_parser().parse_str(legend)
+    return tuple(result)
+
+def parse_legend(legend):
+    """
+    Returns the list of directives in the legend text of a key. Legends that
+    are not directives return an empty list. Raises `pyparsing.ParseException`
+    for invalid directives.
+
+    The results are cached, so the returned directives are shared between
+    keys with the same legend and must not be modified.
+    """
+    return list(_parse_legend_cached(legend))
 
 if __name__ == '__main__':
+    import pyparsing as pp
+
     dparser = DirectiveParser()
 
     in_str = "hex(5.0, x=10.0, y=10.0); screw(5.0, x=10.0, y=10.0)"
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+A table of the case features created by directives.
+
+Directives are compiled into a numpy structured array with one row per
+feature, so the backends that turn them into OpenSCAD objects, board plane
+outlines and pcb footprints can select and place features in bulk.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+import numpy as np
+import numpy.lib.recfunctions as rfn
+
+import collision
+import directives
+
+FEATURE_HEX = 0
+FEATURE_SCREW = 1
+FEATURE_USB_C = 2
+FEATURE_RECT = 3
+
+FEATURE_NAMES = {
+    FEATURE_HEX: directives.HexDirective.KEYWORD,
+    FEATURE_SCREW: directives.ScrewDirective.KEYWORD,
+    FEATURE_USB_C: directives.USBCDirective.KEYWORD,
+    FEATURE_RECT: directives.RectDirective.KEYWORD,
+}
+
+# Size of the hole for a USB Type-C connector. The port points along the y
+# axis, `h` is the length of the hole through the case wall.
+USB_C_L = 9.5
+USB_C_W = 3.6
+USB_C_H = 10
+
+FEATURE_DTYPE = np.dtype([
+    ('kind', 'u1'),
+    # index of the key the directive belongs to
+    ('owner', 'i4'),
+    # index of the array() the feature is a copy in, or -1
+    ('pattern', 'i4'),
+    ('x', 'f8'),
+    ('y', 'f8'),
+    ('z', 'f8'),
+    ('r', 'f8'),
+    # size in the board plane: hex and screw use `l` as their diameter
+    ('l', 'f8'),
+    ('w', 'f8'),
+    ('h', 'f8'),
+    ('scalex', 'f8'),
+    ('scaley', 'f8'),
+    # screw head and the material that retains it in the lid
+    ('head_d', 'f8'),
+    ('head_h', 'f8'),
+    ('shaft_d', 'f8'),
+    ('shaft_h', 'f8'),
+    ('top', '?'),
+    ('lid', '?'),
+    ('pcb', '?'),
+    ('add', '?'),
+    ('flip', '?'),
+])
+
+def _directive_row(directive, top_thickness):
+    """
+    Returns `(kind, fields)` for a directive. The position is relative to
+    the key and is added when the table is compiled.
+    """
+    fields = {
+        'z': 0.0, 'r': 0.0, 'l': 0.0, 'w': 0.0, 'h': top_thickness,
+        'scalex': 1.0, 'scaley': 1.0,
+        'head_d': 0.0, 'head_h': 0.0, 'shaft_d': 0.0, 'shaft_h': 0.0,
+        'top': directive.top, 'lid': directive.lid, 'pcb': directive.pcb,
+        'add': False, 'flip': False,
+    }
+    if type(directive) == directives.HexDirective:
+        kind = FEATURE_HEX
+        fields['l'] = fields['w'] = directive.size
+        fields['r'] = directive.r
+        if directive.h != None:
+            fields['h'] = directive.h
+    elif type(directive) == directives.ScrewDirective:
+        kind = FEATURE_SCREW
+        fields['l'] = fields['w'] = directive.size
+        fields['head_d'] = directive.head_d
+        fields['head_h'] = directive.head_h
+        fields['shaft_d'] = directive.shaft_d
+        fields['shaft_h'] = directive.shaft_h
+    elif type(directive) == directives.USBCDirective:
+        kind = FEATURE_USB_C
+        fields['l'] = USB_C_L
+        fields['w'] = USB_C_H
+        fields['h'] = USB_C_W
+        fields['z'] = directive.z
+        fields['flip'] = directive.flip
+    elif type(directive) == directives.RectDirective:
+        kind = FEATURE_RECT
+        fields['l'] = directive.l
+        fields['w'] = directive.w
+        if directive.h != None:
+            fields['h'] = directive.h
+        fields['z'] = directive.z
+        fields['r'] = directive.r
+        fields['scalex'] = directive.scalex
+        fields['scaley'] = directive.scaley
+        fields['add'] = directive.add
+    else:
+        return None, None
+    return kind, fields
+
+class FeatureTable(object):
+    """
+    Collects the directives of a layout and compiles them into a structured
+    array of `FEATURE_DTYPE`.
+    """
+
+    def __init__(self, spacing=19.0, top_thickness=5.0, pcb_thickness=1.6):
+        self.spacing = spacing
+        self.top_thickness = top_thickness
+        self.pcb_thickness = pcb_thickness
+        self.owner_names = []
+        self.num_patterns = 0
+        self._rows = []
+        self._key_pos = []
+        self._loc = []
+        self._offset = []
+
+    def add_owner(self, name):
+        """ Add a key that directives can belong to, returns its index """
+        self.owner_names.append(name)
+        return len(self.owner_names) - 1
+
+    def add_directive(self, directive, key_pos, owner):
+        """
+        Add a directive found on the key at `key_pos`. Returns False for
+        directives that don't create a feature.
+        """
+        if isinstance(directive, directives.ArrayDirective):
+            instances = directive.get_instances()
+            pattern = self.num_patterns
+        else:
+            instances = [(directive, 0, 0, 0)]
+            pattern = -1
+
+        rows = []
+        for (child, x, y, r) in instances:
+            kind, fields = _directive_row(child, self.top_thickness)
+            if kind == None:
+                return False
+            (offset_x, offset_y) = child.get_offset()
+            fields['kind'] = kind
+            fields['owner'] = owner
+            fields['pattern'] = pattern
+            fields['r'] += r
+            rows.append((fields, child.get_loc(), (offset_x + x, offset_y + y)))
+
+        if pattern != -1:
+            self.num_patterns += 1
+        for (fields, loc, offset) in rows:
+            self._rows.append(fields)
+            self._key_pos.append((key_pos[0], key_pos[1]))
+            self._loc.append(loc)
+            self._offset.append(offset)
+        return True
+
+    def compile(self):
+        """
+        Returns the features as an array of `FEATURE_DTYPE`. Features that
+        are exact duplicates of an earlier one are dropped.
+        """
+        table = np.zeros(len(self._rows), dtype=FEATURE_DTYPE)
+        if len(table) == 0:
+            return table
+        for name in FEATURE_DTYPE.names:
+            if name in ('x', 'y'):
+                continue
+            table[name] = [row[name] for row in self._rows]
+
+        key_pos = np.array(self._key_pos, dtype=float)
+        loc = np.array(self._loc, dtype=float)
+        offset = np.array(self._offset, dtype=float)
+        pos = key_pos + loc * self.spacing/2 + offset
+        table['x'] = pos[:, 0]
+        table['y'] = pos[:, 1]
+
+        return dedup(table)
+
+    def z_range(self, table):
+        """
+        Returns the `(bottom, top)` z coordinates of each feature. The top
+        of the pcb is at z=0 and the top plate starts there.
+        """
+        bottom = np.zeros(len(table))
+        top = np.array(table['h'])
+
+        screw = table['kind'] == FEATURE_SCREW
+        top[screw] = self.top_thickness
+
+        # the hole is centered on the connector
+        usb = table['kind'] == FEATURE_USB_C
+        usb_bottom = np.where(
+            table['flip'], table['z'], table['z'] - self.pcb_thickness - USB_C_W
+        )
+        bottom[usb] = usb_bottom[usb]
+        top[usb] = usb_bottom[usb] + USB_C_W
+
+        rect = table['kind'] == FEATURE_RECT
+        bottom[rect] = table['z'][rect]
+        top[rect] = table['z'][rect] + table['h'][rect]
+        return bottom, top
+
+    def get_name(self, row):
+        return "{} directive of {}".format(
+            FEATURE_NAMES[row['kind']], self.owner_names[row['owner']]
+        )
+
+def iter_rows(table):
+    """
+    Iterate over the rows of `table` as dicts of plain python values, as
+    OpenSCAD output formats numpy scalars differently.
+    """
+    for row in table.tolist():
+        yield dict(zip(FEATURE_DTYPE.names, row))
+
+def dedup(table):
+    """
+    Remove features that are identical to an earlier one apart from the key
+    and the array they were found in.
+    """
+    fields = [
+        name for name in FEATURE_DTYPE.names if name not in ('owner', 'pattern')
+    ]
+    key = rfn.repack_fields(table[fields])
+    _, first = np.unique(key, return_index=True)
+    return table[np.sort(first)]
+
+def group_instances(table):
+    """
+    Group the features that are the same apart from their position and
+    rotation. Returns a list with the rows of each group, ordered by kind
+    and then by the first row of the group.
+    """
+    fields = [
+        name for name in FEATURE_DTYPE.names
+        if name not in ('owner', 'pattern', 'x', 'y', 'r')
+    ]
+    key = rfn.repack_fields(table[fields])
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    order = np.lexsort((first, table['kind'][first]))
+    return [table[inverse == group] for group in order]
+
+def board_features(table):
+    """
+    Returns the rows of `table` that the board backends place. Screws
+    without a size are left out. Select the features with `pcb` set from
+    the result to get the ones that go through the pcb.
+    """
+    return table[(table['kind'] != FEATURE_SCREW) | (table['l'] > 0)]
+
+def board_shapes(feature_table, table):
+    """
+    2D backend: returns the outline of each feature in the board plane as a
+    list of `(name, shape, top, pcb, add)`. `top` is set if the feature
+    reaches into the top plate.
+    """
+    table = board_features(table)
+    bottom, top = feature_table.z_range(table)
+    in_top_plate = table['top'] & (top > 0) & (bottom < feature_table.top_thickness)
+
+    # the rect extrusion is scaled at one end
+    size_l = table['l'] * np.maximum(1.0, np.abs(table['scalex']))
+    size_w = table['w'] * np.maximum(1.0, np.abs(table['scaley']))
+
+    result = []
+    for (i, row) in enumerate(table):
+        kind = row['kind']
+        if kind == FEATURE_HEX:
+            shape = collision.regular_polygon(
+                row['x'], row['y'], row['l'] / math.sqrt(3), 6, angle=row['r']
+            )
+        elif kind == FEATURE_SCREW:
+            shape = collision.Circle([row['x'], row['y']], row['l'] / 2)
+        else:
+            shape = collision.rect_polygon(
+                row['x'], row['y'], size_l[i], size_w[i], angle=row['r']
+            )
+        result.append((
+            feature_table.get_name(row), shape,
+            bool(in_top_plate[i]), bool(row['pcb']), bool(row['add'])
+        ))
+    return result
+
+MOUNTING_HOLE_TEMPLATE = """(module MountingHole_{d:.2f}mm (layer F.Cu)
+  (attr virtual)
+  (fp_text reference REF** (at 0 {ref_y:.3f}) (layer F.SilkS) hide
+    (effects (font (size 1 1) (thickness 0.15)))
+  )
+  (fp_text value MountingHole (at 0 {value_y:.3f}) (layer F.Fab) hide
+    (effects (font (size 1 1) (thickness 0.15)))
+  )
+  (pad "" np_thru_hole circle (at 0 0) (size {d:.3f} {d:.3f}) (drill {d:.3f}) (layers *.Cu *.Mask))
+)
+"""
+
+def mounting_hole_module(diameter):
+    """ Returns a footprint with a single non plated hole """
+    from pykicad import pcbnew
+    return pcbnew.Module.from_str(MOUNTING_HOLE_TEMPLATE.format(
+        d = diameter,
+        ref_y = -diameter/2 - 1,
+        value_y = diameter/2 + 1,
+    ))
+
+def pcb_modules(table, ref="H{}"):
+    """
+    PCB backend: returns the footprints for the features that go through the
+    pcb. Screws become mounting holes, one footprint is shared by all
+    holes of the same size. The other kinds of features have no footprint,
+    `pcb` only checks them against the switch pads.
+    """
+    table = board_features(table)
+    screws = table[(table['kind'] == FEATURE_SCREW) & table['pcb']]
+    footprints = {}
+    result = []
+    for (i, row) in enumerate(screws):
+        diameter = float(row['l'])
+        if diameter not in footprints:
+            footprints[diameter] = mounting_hole_module(diameter)
+        result.append(footprints[diameter].place(
+            float(row['x']), float(row['y']), ref=ref.format(i)
+        ))
+    return result
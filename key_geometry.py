@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+The geometry of the keys of a layout as a numpy structured array.
+
+`compile_keys()` reads the keys of a `kle.KLEKeyboard` once, into one row
+per key. The corners, centers and outline points of all the keys are then
+computed together with numpy, instead of with the `kle.Point` methods of
+each key.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import cmath
+import math
+import numpy as np
+
+import collision
+
+KEY_DTYPE = np.dtype([
+    # top left corner of the key, after rotation, in mm
+    ('x', float),
+    ('y', float),
+    # size in mm
+    ('w', float),
+    ('h', float),
+    # size in units
+    ('u_w', float),
+    ('u_h', float),
+    # rotation in degrees about the origin (rx, ry), and its unit vector
+    ('r', float),
+    ('rx', float),
+    ('ry', float),
+    ('cos', float),
+    ('sin', float),
+    # index of the legends of the key in the list from compile_keys()
+    ('legend', np.int32),
+])
+
+def compile_keys(keyboard):
+    """
+    Returns `(keys, legends)` for the `kle.KLEKeyboard` `keyboard`. `keys`
+    has a row of `KEY_DTYPE` for each key. `legends` is a list of the
+    distinct `get_legend_list()` results of the keys, indexed by the
+    `legend` field.
+    """
+    key_list = list(keyboard.get_keys())
+    keys = np.zeros(len(key_list), dtype=KEY_DTYPE)
+    legends = []
+    legend_index = {}
+    for (i, key) in enumerate(key_list):
+        pos = key.get_pos()
+        # the same rotation as kle, so the corners match it exactly
+        rotation = cmath.exp(key.r_rad*1j)
+        legend = key.get_legend_list()
+        legend_key = tuple(legend)
+        if legend_key not in legend_index:
+            legend_index[legend_key] = len(legends)
+            legends.append(legend)
+        keys[i] = (
+            pos.x, pos.y, key.w, key.h, key.u_w, key.u_h,
+            key.r, key.rx, key.ry, rotation.real, rotation.imag,
+            legend_index[legend_key],
+        )
+    return (keys, legends)
+
+def _edges(keys):
+    """ Returns the width and height edge vectors of each key """
+    edge_w = np.stack([keys['w'] * keys['cos'], keys['w'] * keys['sin']], axis=-1)
+    edge_h = np.stack([-keys['h'] * keys['sin'], keys['h'] * keys['cos']], axis=-1)
+    return (edge_w, edge_h)
+
+def corners(keys):
+    """
+    Returns an array of shape (n, 4, 2) with the corners of each key, in
+    the order of `kle.KLEKey.get_rect_points()`.
+    """
+    pos = np.stack([keys['x'], keys['y']], axis=-1)
+    (edge_w, edge_h) = _edges(keys)
+    return np.stack([pos, pos + edge_w, pos + edge_w + edge_h, pos + edge_h], axis=1)
+
+def centers(keys):
+    """ Returns an array of shape (n, 2) with the center of each key """
+    half_w = 0.5 * keys['w']
+    half_h = 0.5 * keys['h']
+    return np.stack([
+        keys['x'] + (half_w * keys['cos'] - half_h * keys['sin']),
+        keys['y'] + (half_w * keys['sin'] + half_h * keys['cos']),
+    ], axis=-1)
+
+def bounding_box(keys):
+    """ Returns `(x_min, y_min, x_max, y_max)` of all the keys """
+    points = corners(keys).reshape(-1, 2)
+    (x_min, y_min) = points.min(axis=0)
+    (x_max, y_max) = points.max(axis=0)
+    return (x_min, y_min, x_max, y_max)
+
+def _sample_edges(start, end, counts):
+    """
+    Returns points along the edges from `start` to `end`, with `counts + 2`
+    evenly spaced points on each edge including its ends.
+    """
+    result = []
+    # edges with the same number of points are sampled together
+    for n in np.unique(counts):
+        selected = counts == n
+        t = np.linspace(0, 1.0, n + 2)
+        a = start[selected][:, np.newaxis, :]
+        b = end[selected][:, np.newaxis, :]
+        result.append((a + t[:, np.newaxis] * (b - a)).reshape(-1, 2))
+    return result
+
+def outline_points(keys, density=1):
+    """
+    Returns the distinct points on the edges of all the keys, as an array of
+    shape (m, 2) sorted by x then y. Each edge has `density` points plus
+    one for every full unit of its length, besides its corners.
+    """
+    if len(keys) == 0:
+        return np.zeros((0, 2))
+    rect = corners(keys)
+    n_w = np.floor(keys['u_w']).astype(int) + density
+    n_h = np.floor(keys['u_h']).astype(int) + density
+    points = [rect.reshape(-1, 2)]
+    points += _sample_edges(rect[:, 0], rect[:, 1], n_w)
+    points += _sample_edges(rect[:, 2], rect[:, 3], n_w)
+    points += _sample_edges(rect[:, 0], rect[:, 3], n_h)
+    points += _sample_edges(rect[:, 1], rect[:, 2], n_h)
+    return np.unique(np.concatenate(points), axis=0)
+
+# clip notches on the top and bottom of a switch hole
+CLIP_W = 1.2
+CLIP_H = 1.7
+CLIP_DEPTH = 1.5
+CLIP_SPACE = 1.9
+
+def switch_hole_outline(pos_x, pos_y, angle, hole_size=14.0):
+    """
+    Returns the outline of a switch hole and its clip notches in the plane
+    of the plate as a list of `collision.Polygon`.
+    """
+    clip_x = CLIP_SPACE/2 + CLIP_W/2
+    clip_y = hole_size/2 + CLIP_DEPTH/2
+    theta = math.radians(angle)
+
+    result = [collision.rect_polygon(pos_x, pos_y, hole_size, hole_size, angle)]
+    for (x, y) in [(-clip_x, -clip_y), (clip_x, -clip_y), (-clip_x, clip_y), (clip_x, clip_y)]:
+        result.append(collision.rect_polygon(
+            pos_x + x*math.cos(theta) - y*math.sin(theta),
+            pos_y + x*math.sin(theta) + y*math.cos(theta),
+            CLIP_W, CLIP_DEPTH, angle
+        ))
+    return result
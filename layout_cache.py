@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Load layout files, keeping the parsed result in a cache file.
+
+A layout is a KLE json file, or a yaml file with the same content, with
+an optional `options` block. Loading it means reading the yaml or json,
+building the keys and parsing the directives in every legend. The result
+is saved as a `CompiledLayout` with the hash of the layout file, so later
+runs on an unchanged file load it directly.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+import os
+import pickle
+import sys
+
+import directives
+
+# Change this when the content of `CompiledLayout` changes
+CACHE_VERSION = 1
+
+def _code_hash():
+    """ Hash of the code that makes the objects kept in the cache """
+    import kle
+    digest = hashlib.sha256(str(CACHE_VERSION).encode("utf-8"))
+    digest.update(getattr(kle, "__version__", "").encode("utf-8"))
+    # the cache holds pickled kle and `CompiledLayout` objects, so an edit
+    # to their classes must not load an old cache
+    kle_module = sys.modules[kle.KLEKeyboard.__module__]
+    for source in (__file__, directives.__file__, kle_module.__file__):
+        with open(source, "rb") as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+def read_layout(text, file_ext):
+    """ Returns the `(options, rows)` in the text of a layout file """
+    if file_ext == ".yaml":
+        import yaml
+        # use libyaml if it is installed
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        layout = yaml.load(text, Loader=loader)
+    else:
+        import json
+        layout = json.loads(text)
+
+    if isinstance(layout, dict):
+        return (layout.get("options", {}), layout["layout"])
+    return ({}, layout)
+
+class CompiledLayout(object):
+    """
+    A parsed layout file. `options` are the options set in the file, with
+    the names used on the command line. `directives` maps the legends that
+    were parsed without errors to their directives.
+    """
+    def __init__(self, file_hash, options, rows):
+        self.file_hash = file_hash
+        self.options = options
+        self.rows = rows
+        self.spacing = None
+        self.keyboard = None
+        self.directives = {}
+        self.changed = True
+
+    def get_keyboard(self, spacing):
+        """ Returns the `kle.KLEKeyboard` of the layout for `spacing` """
+        if self.keyboard == None or self.spacing != spacing:
+            import kle
+            self.keyboard = kle.KLEKeyboard.from_json(self.rows, spacing=spacing)
+            self.spacing = spacing
+            self.changed = True
+            self.parse_directives()
+        return self.keyboard
+
+    def parse_directives(self):
+        for key in self.keyboard.get_keys():
+            for (_, legend) in key.get_legend_list():
+                if legend in self.directives:
+                    continue
+                try:
+                    self.directives[legend] = tuple(directives.parse_legend(legend))
+                except Exception:
+                    # left out, so the error is reported when it is used
+                    pass
+
+def load_layout(file_name, cache_file=None):
+    """
+    Returns the `CompiledLayout` of the layout file `file_name`. If
+    `cache_file` is given, it is loaded from there when the layout file
+    hasn't changed. Call `save_layout()` to update the cache.
+    """
+    with open(file_name, "rb") as layout_file:
+        contents = layout_file.read()
+    digest = hashlib.sha256(contents)
+    digest.update(_code_hash().encode("utf-8"))
+    file_hash = digest.hexdigest()
+
+    if cache_file != None and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as in_file:
+                layout = pickle.load(in_file)
+            if isinstance(layout, CompiledLayout) and layout.file_hash == file_hash:
+                layout.changed = False
+                return layout
+        except Exception:
+            # an unreadable cache is replaced
+            pass
+
+    file_ext = os.path.splitext(file_name)[1]
+    (options, rows) = read_layout(contents.decode("utf-8"), file_ext)
+    return CompiledLayout(file_hash, options, rows)
+
+def save_layout(layout, cache_file):
+    """ Write `layout` to `cache_file` if it changed since it was loaded """
+    if not layout.changed:
+        return
+    temp_file = cache_file + ".tmp"
+    with open(temp_file, "wb") as out_file:
+        pickle.dump(layout, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, cache_file)
+    layout.changed = False
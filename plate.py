@@ -5,194 +5,86 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from solid import *
-from solid.utils import *
+import time
 
+# the start of the run, so --timing includes the time taken by the imports
+START_TIME = time.perf_counter()
+
+import errno
 import os
 import sys
-import math
-import numpy as np
 
 import alpha_shape
+import collision
+import wall_thickness
 from pykicad import pcbnew
+from pykicad import pcbnew_geom
+from pykicad import pcbnew_drc
 import kle
 import directives
-
-import pyparsing
+import features
+import key_geometry
+import layout_cache
 
 script_path = os.path.dirname(os.path.abspath(__file__))
 
-def switch_hole_local(thickness, spacing=19.0, hole_size=14.0, hole_extra=0.0):
-    # switch hole
-    switch_w = hole_size
-    switch_h = hole_size
-    main_switch_hole = translate([0, 0, -hole_extra/2])(
-        cube([switch_w, switch_h, thickness + hole_extra])
-    )
-    if hole_extra != 0.0:
-        offset = -( spacing - hole_size) / 2
-        main_switch_hole += translate([offset, offset, thickness-0.01])(
-            cube([spacing, spacing, 3])
-        )
-
-
-    # clip hole
-    clip_w = 1.2
-    clip_h = 1.7
-    clip_depth = 1.5
-    clip_hole = cube([clip_w, clip_depth, clip_h])
-
-    top_plate_offset = 1.3
-    clip_space = 1.9
-
-    clip0_x = switch_w / 2 - clip_space / 2 - clip_w
-    clip0_y = -clip_depth
-    clip1_x = switch_w / 2 + clip_space / 2
-    clip1_y = clip0_y
-
-    clip2_x = clip0_x
-    clip2_y = switch_h
-    clip3_x = clip1_x
-    clip3_y = clip2_y
-
-    # main_switch_hole = translate([0, clip_depth, 0])(main_switch_hole)
-    z = thickness - clip_h - top_plate_offset
-    # z = thickness + clip_h + top_offset
-
-    clip_0 = translate([clip0_x, clip0_y, z])(clip_hole)
-    clip_1 = translate([clip1_x, clip1_y, z])(clip_hole)
-    clip_2 = translate([clip2_x, clip2_y, z])(clip_hole)
-    clip_3 = translate([clip3_x, clip3_y, z])(clip_hole)
-
-    # combinded = union()(main_switch_hole, clip_0, clip_1, clip_2, clip_3)
-
-    # return scale([1, 1, 1+epsilon])(combinded)
-    return [main_switch_hole, clip_0, clip_1, clip_2, clip_3]
-
-
-def create_switch_hole(pos_x, pos_y, angle, thickness, spacing=19.0, hole_size=14.0,
-                hole_extra=0.0):
-    switch_hole = switch_hole_local(
-        thickness + 0,
-        spacing=spacing,
-        hole_size=hole_size,
-        hole_extra=hole_extra
-    )
-    return translate([pos_x, pos_y, -0])(rotate([0, 0, angle])(
-        translate([-hole_size/2, -hole_size/2, 0])(switch_hole)))
-
-def create_hex_hole(pos_x, pos_y, size, thickness, pos_z=0.0, angle=0.0):
-
-    outside_circle_r = size / math.sqrt(3)
-    hex_hole = render()(
-        cylinder(r=outside_circle_r, h=thickness, segments=6)
-    )
-
-    return translate([pos_x, pos_y, pos_z])(
-        rotate([0, 0, angle])(
-            hex_hole
-        )
-    )
-
-def create_rect_hole(pos_x, pos_y, l, w, h, scale=[1.0, 1.0], pos_z=0.0, angle=0.0):
-    # return translate([pos_x, pos_y, pos_z + h/2])(
-    #     rotate([0, 0, angle])(
-    #         cube([l, w, h], center=True)
-    #     )
-    # )
-
-    rect = linear_extrude(height = h, scale=scale, center=True)(
-        square([l, w], center=True)
-    )
-
-    if scale[0] < 0:
-        rect = mirror([0, 0, 1])( rect )
-        scale[0] *= -1
-    if scale[1] < 0:
-        rect = mirror([0, 0, 1])( rect )
-        scale[1] *= -1
-
-
-    return translate([pos_x, pos_y, pos_z + h/2])(
-        rotate([0, 0, angle])(
-            rect
-        )
-    )
-
-
-
-SCREW_SEGMENTS = 20
-
-def create_screw_hole(pos_x, pos_y, radius, thickness, pos_z=0):
-
-    screw_hole = render()(
-        cylinder(r=radius, h=thickness, segments=SCREW_SEGMENTS)
-    )
-
-    return translate([pos_x, pos_y, pos_z])(
-        screw_hole
-    )
-
-class HoleBuilder(object):
-    def __init__(self, top_plate_thickness=5.0, pcb_thickness=1.6, segments=15):
-        self.top_plate_thickness = top_plate_thickness
-        self.pcb_thickness = pcb_thickness
-        self.segments = segments
-
-    def create_usb_c_hole(self, pos_x, pos_y, pos_z=0, flip=False):
-        l = 9.5
-        w = 3.6
-        h = 10
-        corner_raidus = 0.8
-        segs = min(self.segments, 20)
-
-        port_hole = render()(
-            rotate([-90, 0, 0])(
-                linear_extrude(height=h, center=True)(
-                    rounding(r=corner_raidus, segments=segs)(
-                        square([l, w], center=True)
-                    )
-                )
-            )
-        )
-
-
-        z_offset = -self.pcb_thickness - w/2
-        if flip:
-            z_offset = +w/2
-
-        return translate([pos_x, pos_y, pos_z + z_offset])(
-            port_hole
-        )
+class StageTimer(object):
+    """ Records how long each stage of a run takes, for --timing """
+    def __init__(self, start=None):
+        self.last = time.perf_counter() if start == None else start
+        self.stages = []
+
+    def mark(self, name):
+        """ End the current stage, which is named `name` """
+        now = time.perf_counter()
+        self.stages.append((name, now - self.last))
+        self.last = now
+
+    def __str__(self):
+        lines = [
+            "{:<16}{:8.3f} s".format(name + ":", seconds)
+            for (name, seconds) in self.stages
+        ]
+        lines.append("{:<16}{:8.3f} s".format(
+            "total:", sum(seconds for (_, seconds) in self.stages)
+        ))
+        return "\n".join(lines)
+
+# the files that can be selected with --only
+ARTIFACTS = ('pcb', 'case', 'lid', 'parts')
+
+def artifact_list(text):
+    """ Parse a comma separated list of names from `ARTIFACTS` """
+    result = [name.strip() for name in text.split(",") if name.strip()]
+    for name in result:
+        if name not in ARTIFACTS:
+            raise ValueError("unknown output: " + name)
+    return result
+
+# The switch footprint for each key width in units. 0 is used for all other
+# sizes.
+KEY_FOOTPRINT_FILES = {
+    0:    "Cherry_MX_Matias_NoSilk_Back.kicad_mod",
+    1.00: "Cherry_MX_Matias_u1_NoSilk_Back.kicad_mod",
+    1.25: "Cherry_MX_Matias_u1.25_NoSilk_Back.kicad_mod",
+    1.50: "Cherry_MX_Matias_u1.5_NoSilk_Back.kicad_mod",
+    1.75: "Cherry_MX_Matias_u1.75_NoSilk_Back.kicad_mod",
+    2.00: "Cherry_MX_Matias_u2_NoSilk_Back.kicad_mod",
+    2.25: "Cherry_MX_Matias_u2.25_NoSilk_Back.kicad_mod",
+    2.50: "Cherry_MX_Matias_u2.5_NoSilk_Back.kicad_mod",
+    2.75: "Cherry_MX_Matias_u2.75_NoSilk_Back.kicad_mod",
+    3.00: "Cherry_MX_Matias_u3_NoSilk_Back.kicad_mod",
+}
 
 class PCBBuilder(object):
 
     def __init__(self, pcb_thickness=1.6):
-        switch      = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_NoSilk_Back.kicad_mod")))
-        switch_1    = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u1_NoSilk_Back.kicad_mod")))
-        switch_1_25 = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u1.25_NoSilk_Back.kicad_mod")))
-        switch_1_5  = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u1.5_NoSilk_Back.kicad_mod")))
-        switch_1_75 = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u1.75_NoSilk_Back.kicad_mod")))
-        switch_2    = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u2_NoSilk_Back.kicad_mod")))
-        switch_2_25 = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u2.25_NoSilk_Back.kicad_mod")))
-        switch_2_5  = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u2.5_NoSilk_Back.kicad_mod")))
-        switch_2_75 = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u2.75_NoSilk_Back.kicad_mod")))
-        switch_3    = pcbnew.Module.from_file("%s/%s"%(script_path, os.path.join("mx.pretty","Cherry_MX_Matias_u3_NoSilk_Back.kicad_mod")))
-
-        self.key_footprints = {
-            0:    switch,
-            1.00: switch_1,
-            1.25: switch_1_25,
-            1.50: switch_1_5,
-            1.75: switch_1_75,
-            2.00: switch_2,
-            2.25: switch_2_25,
-            2.50: switch_2_5,
-            2.75: switch_2_75,
-            3.00: switch_3,
-        }
+        # footprints are loaded when they are first used, parsing them
+        # takes longer than the rest of the PCB
+        self.key_footprints = {}
 
         self.sw_ref_counter = 0
+        self.switches = []
 
         self.pcb = pcbnew.PCBDocument()
         self.pcb.general.set_thickness(pcb_thickness)
@@ -201,63 +93,127 @@ class PCBBuilder(object):
         key_u = w / spacing
         key_u_h = h / spacing
 
-        if key_u_h == 1.0 and key_u in self.key_footprints:
-            key_foot = self.key_footprints[key_u]
+        if key_u_h == 1.0 and key_u in KEY_FOOTPRINT_FILES:
+            key_foot = self.get_key_footprint(key_u)
         else:
-            key_foot = self.key_footprints[0]
+            key_foot = self.get_key_footprint(0)
 
-        self.pcb += key_foot.place(x, y, a=-r, ref=ref.format(self.sw_ref_counter))
+        ref = ref.format(self.sw_ref_counter)
+        switch = key_foot.place(x, y, a=-r, ref=ref)
+        self.pcb += switch
+        self.switches.append(switch)
         self.sw_ref_counter += 1
+        return ref
+
+    def add_switches(self, keys, centers, ref="SW{}", spacing=19.0):
+        """
+        Add a switch for each row of the `key_geometry` array `keys`, at
+        `centers`. Returns the list of references of the switches.
+        """
+        return [
+            self.add_switch(x, y, w, h, r, ref=ref, spacing=spacing)
+            for ((x, y), w, h, r) in zip(
+                centers.tolist(), keys['w'].tolist(), keys['h'].tolist(),
+                keys['r'].tolist()
+            )
+        ]
 
-    def add_edge_cuts(self, path):
-        for i in range(len(path) - 1):
-            self.pcb += pcbnew.GR_Line(
-                start = path[i],
-                end = path[i+1],
-                layer="Edge.Cuts"
+    def get_key_footprint(self, key_u):
+        if key_u not in self.key_footprints:
+            self.key_footprints[key_u] = pcbnew.Module.from_file(
+                os.path.join(script_path, "mx.pretty", KEY_FOOTPRINT_FILES[key_u])
             )
-        self.pcb += pcbnew.GR_Line(
-            start = path[len(path)-1],
-            end = path[0],
-            layer="Edge.Cuts"
-        )
+        return self.key_footprints[key_u]
+
+    def add_module(self, module):
+        self.pcb += module
+
+    def add_edge_cuts(self, path, arc_tolerance=0.0):
+        """
+        Add the closed path `path` to the Edge.Cuts layer. Runs of segments
+        that are within `arc_tolerance` of a circle are drawn as arcs.
+        """
+        for segment in alpha_shape.fit_arcs(path, arc_tolerance):
+            if segment[0] == "arc":
+                (_, center, start, angle) = segment
+                self.pcb += pcbnew.GR_Arc(
+                    start = center,
+                    end = start,
+                    angle = angle,
+                    layer="Edge.Cuts"
+                )
+            else:
+                (_, start, end) = segment
+                self.pcb += pcbnew.GR_Line(
+                    start = start,
+                    end = end,
+                    layer="Edge.Cuts"
+                )
 
-    def write_to_file(self, file_name):
+    def write_to_file(self, file_name, update=False):
+        if update and os.path.exists(file_name):
+            # Keep the routing of the existing board and only move what changed
+            from pykicad import pcbnew_update
+            pcbnew_update.update_file(file_name, self.pcb)
+            return
+        self.pcb.write_to_file(file_name)
+
+    def get_modules(self):
+        return [obj for obj in self.pcb.objects if isinstance(obj, pcbnew.Module)]
+
+    def get_geometry(self):
+        return pcbnew_geom.BoardGeometry(self.get_modules())
+
+    def get_pad_index(self):
+        """
+        Returns a `collision.ShapeIndex` of the pads of the switches.
+        """
+        geometry = pcbnew_geom.BoardGeometry(self.switches)
+        shapes = []
+        labels = []
+        for i in range(len(geometry.pad_centers)):
+            radius = max(geometry.pad_sizes[i].max(), geometry.pad_drills[i]) / 2
+            shapes.append(collision.Circle(geometry.pad_centers[i], radius))
+            ref = geometry.modules[geometry.pad_module[i]].get_reference()
+            if geometry.pad_names[i]:
+                labels.append("{} pad {}".format(ref, geometry.pad_names[i]))
+            else:
+                labels.append("{} hole".format(ref))
+        return collision.ShapeIndex(shapes, labels)
+
+    def check_clearance(self, pad_clearance, drill_clearance):
+        """
+        Returns a list of pad and drill clearance violations between the
+        placed footprints.
+        """
+        geometry = self.get_geometry()
+        return pcbnew_drc.check_pad_clearance(geometry, pad_clearance) + \
+            pcbnew_drc.check_drill_clearance(geometry, drill_clearance)
+
+    def write_pos_file(self, file_name):
         with open(file_name, "w", encoding="utf-8") as out_file:
-            out_file.write(self.generate_str())
+            pcbnew_geom.write_pos_file(out_file, self.get_modules())
 
     def generate_str(self):
         return self.pcb.generate()
 
-class OpenSCADObjectBuilder(object):
-    def __init__(self, obj=None):
-        self.add_list = []
-        self.del_list = []
-        if obj:
-            self.add_list.append(obj)
-
-    def __add__(self, other):
-        self.add_list.append(other)
-        return self
-
-    def __sub__(self, other):
-        self.del_list.append(other)
-        return self
-
-    def generate(self):
-        return union()(self.add_list) - self.del_list
-
 class KeyboardBuilder(object):
 
-    def __init__(self, json_object, options):
+    def __init__(self, json_object, options, timer=None, layout=None):
+        """
+        `layout` is a `layout_cache.CompiledLayout`, used instead of
+        `json_object` when it is given.
+        """
         self.opt = options
+        self.timer = timer if timer != None else StageTimer()
 
-        self.kle_layout = kle.KLEKeyboard.from_json(json_object, spacing=self.opt.spacing)
-
-        if self.opt.fast:
-            self.epsilon = 1e-4
+        if layout != None:
+            self.kle_layout = layout.get_keyboard(self.opt.spacing)
+            self.legend_directives = layout.directives
         else:
-            self.epsilon = 0
+            self.kle_layout = kle.KLEKeyboard.from_json(json_object, spacing=self.opt.spacing)
+            self.legend_directives = {}
+        (self.keys, self.key_legends) = key_geometry.compile_keys(self.kle_layout)
 
     def write_to_file(self, file_name):
         with open(file_name, "w", encoding="utf-8") as out_file:
@@ -320,430 +276,255 @@ class KeyboardBuilder(object):
             result.append(tuple(new_point))
         return result
 
-    def generate(self, _time=0):
-        scad_morphology_path = "%s/%s"%(script_path, os.path.join("scad-utils", "morphology.scad"))
-        use(scad_morphology_path)
-
-        self.case = OpenSCADObjectBuilder()
-        self.lid = OpenSCADObjectBuilder()
+    def generate(self, _time=0, parts=('case', 'lid')):
+        """
+        Build the PCB and returns the OpenSCAD objects `(case, lid)`. Only
+        the ones named in `parts` are built, the others are None. With no
+        `parts`, only what the PCB and the layout checks need is built.
+        """
+        self.case_builder = None
+        if parts:
+            # SolidPython is slow to load, so only load it to build the case
+            import case_builder
+            self.case_builder = case_builder.CaseBuilder(self, parts)
         self.kb_pcb = PCBBuilder(self.opt.pcb_thickness)
-
-        outline_point_set = set()
-
-        up_x = math.inf
-        up_y = math.inf
-        bot_x = -math.inf
-        bot_y = -math.inf
+        self.timer.mark("pcb setup")
+
+        # Outlines of the switch holes and directives in the board plane,
+        # used to check the layout for collisions
+        self.switch_holes = []
+        self.features = []
+        self.feature_table = features.FeatureTable(
+            spacing = self.opt.spacing,
+            top_thickness = self.opt.top_thickness,
+            pcb_thickness = self.opt.pcb_thickness,
+        )
 
         spacing = self.opt.spacing
         hole_size = self.opt.switch_hole_size
 
-        for key in self.kle_layout.get_keys():
-
-            def add_points(point1, point2, n):
-                result = set()
-                dv = point2 - point1
-
-                for (i, t) in enumerate(np.linspace(0, 1.0, n+2)):
-                    result.add(point1 + (float(t)*dv))
-                return result
-
-            points = key.get_rect_points()
-
-            outline_point_set.update(set(points))
-
-            n_w = math.floor(key.u_w) + self.opt.alpha_density
-            outline_point_set.update(add_points(points[0], points[1], n_w))
-            outline_point_set.update(add_points(points[2], points[3], n_w))
-            n_h = math.floor(key.u_h) + self.opt.alpha_density
-            outline_point_set.update(add_points(points[0], points[3], n_h))
-            outline_point_set.update(add_points(points[1], points[2], n_h))
-
-
-            for point in key.get_rect_points():
-                up_x = min(point.x, up_x)
-                up_y = min(point.y, up_y)
-
-                bot_x = max(point.x, bot_x)
-                bot_y = max(point.y, bot_y)
-        margin = self.opt.margin
-        margin = self.opt.margin
-        size_x = abs(bot_x - up_x) + margin
-        size_y = abs(bot_y - up_y) + margin
-
-        case_outline = None
-
-        top_thickness = self.opt.top_thickness
-        bot_thickness = self.opt.bot_thickness
-
         # Use the outline points to determine the bounding polygons for the
         # case and the PCB
-        outline_point_list = list(outline_point_set)
+        outline_point_list = key_geometry.outline_points(
+            self.keys, self.opt.alpha_density
+        ).tolist()
 
         _, case_perimeter = alpha_shape.alpha_shape(self.opt.alpha, outline_point_list)
         _, pcb_perimeter = alpha_shape.alpha_shape(self.opt.pcb_alpha, outline_point_list)
 
         case_path = self.edge_list_to_path(case_perimeter, outline_point_list)
-        outline_poly = polygon(points=case_path)
+        case_path = alpha_shape.simplify_path(case_path, self.opt.outline_tolerance)
 
         pcb_un_inset_path = self.edge_list_to_path(pcb_perimeter, outline_point_list)
+        pcb_un_inset_path = alpha_shape.simplify_path(
+            pcb_un_inset_path, self.opt.outline_tolerance
+        )
         inset_size = 2.5
 
+        # inset_path expects a counter-clockwise path
+        if wall_thickness.path_area(pcb_un_inset_path) < 0:
+            pcb_un_inset_path = pcb_un_inset_path[::-1]
         pcb_inset_path = self.inset_path(pcb_un_inset_path, inset_size)
 
-        self.kb_pcb.add_edge_cuts(pcb_inset_path)
-        pcb_poly = polygon(points=pcb_inset_path)
-
-        # With the case outline, start constructing the 3D shape of the case
-        if self.opt.corner_type == "spherical":
-            corner_raidus = 1.5
-            segs = self.opt.segments
-            top_plate = translate([corner_raidus, corner_raidus, corner_raidus])(
-                minkowski()(
-                    cube([
-                        size_x - corner_raidus*2,
-                        size_y - corner_raidus*2,
-                        top_thickness - corner_raidus*2,
-                    ]),
-                    sphere(r=corner_raidus, segments=segs)
-                ),
-            )
-            bot_case = translate([corner_raidus, corner_raidus, corner_raidus-bot_thickness])(
-                minkowski()(
-                    cube([
-                        size_x - corner_raidus*2,
-                        size_y - corner_raidus*2,
-                        bot_thickness - corner_raidus*2,
-                    ]),
-                    sphere(r=corner_raidus, segments=segs)
-                ),
-            )
-        elif self.opt.corner_type == "cylinder":
-            corner_raidus = 3
-            segs = self.opt.segments
-            if self.opt.margin < 0:
-                case_outline_poly = inset(d=-self.opt.margin)(outline_poly)
-            elif self.opt.margin > 0:
-                case_outline_poly = outset(d=self.opt.margin)(outline_poly)
-            else:
-                case_outline_poly = outline_poly
-            case_outline = fillet(r=corner_raidus, segments=segs)(
-                rounding(r=corner_raidus, segments=segs)(
-                    case_outline_poly
-                )
-            )
-        elif self.opt.corner_type == "rectangular":
-            case_outline = outline_poly
-
-        if self.opt.corner_type in ["cylinder", "rectangular"]:
-            top_plate = linear_extrude(top_thickness)(case_outline)
-            bot_case = translate([0, 0, -bot_thickness])(
-                linear_extrude(bot_thickness)(case_outline)
-            )
-            lid_cutout_inset = 2.5-self.opt.pcb_tolerance
-            lid_cutout_outline = inset(d=lid_cutout_inset,segments=self.opt.segments)(case_outline)
-            lid_inset = lid_cutout_inset+self.opt.lid_tolerance
-            lid_outline = inset(d=lid_inset,segments=self.opt.segments)(case_outline)
-            self.lid += linear_extrude(self.opt.lid_thickness)(lid_outline)
-            lid_cutout = linear_extrude(self.opt.lid_thickness)(lid_cutout_outline)
-
-        pcb_edge = (self.opt.spacing - self.opt.switch_hole_size) / 2
-        pcb_inset_outset = -pcb_edge + self.opt.pcb_margin + self.opt.pcb_tolerance
-        if pcb_inset_outset < 0:
-            pcb_cutout = inset(-pcb_inset_outset)(
-                polygon(pcb_un_inset_path)
-            )
-        elif pcb_inset_outset > 0:
-            pcb_cutout = outset(pcb_inset_outset)(
-                polygon(pcb_un_inset_path)
-            )
-        elif pcb_inset_outset == 0:
-            pcb_cutout = polygon(pcb_un_inset_path)
-
-        bot_case_cavity = translate([0, 0, -bot_thickness])(
-            linear_extrude(bot_thickness+self.opt.pcb_tolerance_z)(
-                pcb_cutout
-            )
-        ) + translate([0, 0, -bot_thickness])(
-            lid_cutout
-        )
+        self.kb_pcb.add_edge_cuts(pcb_inset_path, self.opt.pcb_arc_tolerance)
+        self.timer.mark("outline")
 
+        # inset_path expects a counter-clockwise path
+        if wall_thickness.path_area(case_path) < 0:
+            ccw_case_path = case_path[::-1]
+        else:
+            ccw_case_path = case_path
+        if self.opt.margin != 0:
+            margin_path = self.inset_path(ccw_case_path, -self.opt.margin)
+        else:
+            margin_path = ccw_case_path
 
-#         if 0:
-#             # # bottom case cavity
-#             safety_margin = 0.5
-#             safety_margin = 1.5
-#             gap_size = spacing - hole_size - safety_margin
-#             bot_x = -margin/2 + gap_size/2
-#             bot_y = -margin/2 + gap_size/2
-#             bot_size_x = size_x - gap_size
-#             bot_size_y = size_y - gap_size
-#             bot_case_cavity = translate([bot_x, bot_y, -bot_thickness])(
-#                 cube([bot_size_x, bot_size_y, bot_thickness])
-#             )
-
-        # take cavity out of botcase
-        body = None
-        if self.opt.plate_only:
-            body = top_plate
+        # The outline of the top plate used for checking wall thickness.
+        # The rounded corners of the case are ignored.
+        if self.opt.corner_type == "spherical" or \
+                self.opt.corner_type == "cylinder" and self.opt.margin != 0:
+            self.plate_outline = margin_path
         else:
-            if self.opt.corner_type == "spherical":
-                body = hull()(top_plate + bot_case) - bot_case_cavity
-            else:
-                body = (top_plate + bot_case) - bot_case_cavity
+            self.plate_outline = case_path
 
-        self.case += body
+        # With the case outline, start constructing the 3D shape of the case
+        if parts:
+            self.case_builder.create_case_body(case_path, margin_path, pcb_un_inset_path)
+            self.timer.mark("case body")
 
-        dParser = directives.DirectiveParser()
-        hole_builder = HoleBuilder(
-            top_plate_thickness = top_thickness,
-            pcb_thickness = self.opt.pcb_thickness,
-            segments = self.opt.segments
-        )
+        key_centers = key_geometry.centers(self.keys)
+        switch_refs = self.kb_pcb.add_switches(self.keys, key_centers, spacing=spacing)
 
-        for (i, key) in enumerate(self.kle_layout.get_keys()):
-            key_pos = key.get_center()
+        switch_positions = []
+        strut_positions = []
+        for (i, switch_ref) in enumerate(switch_refs):
+            key_pos = key_centers[i].tolist()
             x, y = key_pos
-            w, h = key.w, key.h
-            angle = key.r
+            angle = float(self.keys['r'][i])
 
-            key_sw_support = self.opt.lid_struts
-
-            self.kb_pcb.add_switch(
-                x, y, w, h, angle,
-                spacing=spacing
-            )
+            key_sw_support = self.opt.lid_struts and not self.opt.fast
 
+            self.switch_holes.append((
+                switch_ref,
+                key_geometry.switch_hole_outline(x, y, angle, hole_size)
+            ))
+            key_owner = self.feature_table.add_owner(switch_ref)
 
-            for (leg_pos, legend) in key.get_legend_list():
+            for (leg_pos, legend) in self.key_legends[self.keys['legend'][i]]:
                 directive_list = None
                 try:
-                    directive_list = dParser.parse_str(legend)
-                except pyparsing.ParseException as err:
-                    print("Warning: failed to parse directive: " + str(err), file=sys.stderr)
-                    print(legend, file=sys.stderr)
-                    print(" "*(err.col-1) + "^", file=sys.stderr)
+                    if legend in self.legend_directives:
+                        directive_list = list(self.legend_directives[legend])
+                    else:
+                        directive_list = directives.parse_legend(legend)
                 except Exception as err:
                     print("Warning: failed to parse directive: " + str(err), file=sys.stderr)
                     print(legend, file=sys.stderr)
+                    # a pyparsing.ParseException gives the column of the error
+                    if hasattr(err, 'col'):
+                        print(" "*(err.col-1) + "^", file=sys.stderr)
 
                 if directive_list == None:
                     continue
 
                 for directive in directive_list:
-                    loc = directive.get_loc()
-                    dir_loc = kle.Point(loc[0], loc[1]) * spacing/2
-
-                    dir_offset = kle.Point(*directive.get_offset())
-                    item_pos = key_pos + dir_loc + dir_offset
-
-                    if type(directive) == directives.HexDirective:
-                        # Create a hex hole
-                        if directive.h != None:
-                            thickness = directive.h
-                        else:
-                            thickness = top_thickness
-                        if  directive.top:
-                            self.case -= create_hex_hole(
-                                item_pos.x,
-                                item_pos.y,
-                                directive.size,
-                                thickness,
-                                angle=directive.r
-                            )
-                    elif type(directive) == directives.ScrewDirective:
-                        # Create a screw hole
-                        if directive.top:
-                            self.case -= create_screw_hole(
-                                item_pos.x,
-                                item_pos.y,
-                                radius = directive.size / 2,
-                                thickness = top_thickness,
-                            )
-                        if directive.lid:
-                            screw_d = directive.size
-                            screw_retain_thickness = directive.shaft_h
-                            screw_retain_d = directive.shaft_d
-                            screw_head_h = directive.head_h
-                            screw_head_d = directive.head_d
-                            screw_shaft_length = max(
-                                screw_retain_thickness,
-                                self.opt.lid_thickness
-                            )
-                            # main shaft for screw hole in lid
-                            self.lid -= create_screw_hole(
-                                item_pos.x,
-                                item_pos.y,
-                                radius = directive.size / 2,
-                                thickness = screw_shaft_length
-                            )
-                            if screw_head_d:
-                                self.lid -= translate([
-                                        item_pos.x,
-                                        item_pos.y,
-                                        screw_head_h
-                                    ])(
-                                    cylinder(
-                                        r1 = screw_head_d/2,
-                                        r2 = screw_d/2,
-                                        # h = (screw_retain_thickness-screw_head_h),
-                                        h = (screw_retain_thickness-screw_head_h),
-                                        segments = SCREW_SEGMENTS
-                                    )
-                                )
-
-                                # make inset hole for screw head in lid
-                                self.lid -= create_screw_hole(
-                                    item_pos.x,
-                                    item_pos.y,
-                                    radius = screw_head_d / 2,
-                                    thickness = screw_head_h,
-                                )
-
-                                # add extra material on the lid to retain the inset
-                                # screw hole
-                                self.lid += create_screw_hole(
-                                    item_pos.x,
-                                    item_pos.y,
-                                    radius = screw_retain_d / 2,
-                                    thickness = screw_retain_thickness,
-                                )
-                    elif type(directive) == directives.USBCDirective:
-                        # Creat a hole for a USB Type-C connector
-                        if directive.top:
-                            self.case -= hole_builder.create_usb_c_hole(
-                                item_pos.x,
-                                item_pos.y,
-                                flip=directive.flip,
-                                pos_z=directive.z,
-                            )
-                    elif type(directive) == directives.RectDirective:
-                        # Create a rectangular hole
-                        if directive.h != None:
-                            h = directive.h
-                        else:
-                            h = top_thickness
-                        rect = create_rect_hole(
-                            item_pos.x, item_pos.y,
-                            directive.l, directive.w, h,
-                            [directive.scalex, directive.scaley],
-                            pos_z=directive.z,
-                            angle=directive.r
-                        )
-                        if directive.top:
-                            if directive.add:
-                                self.case += rect
-                            else:
-                                self.case -= rect
-                        if directive.lid:
-                            if directive.add:
-                                self.lid += rect
-                            else:
-                                self.lid -= rect
-                        # if directive.pcb:
-                    elif isinstance(directive, directives.StrutDirective):
-                        key_sw_support = directive.is_used
-                    else:
+                    if isinstance(directive, directives.StrutDirective):
+                        key_sw_support = directive.is_used and not self.opt.fast
+                    elif not self.feature_table.add_directive(directive, key_pos, key_owner):
                         print("Warning> Unknown directive: {}".format(directive), file=sys.stderr)
 
             if key_sw_support:
-                # height of switch plate affects the bottom position of the
-                # stem relative to the lid.
-                bot_of_stem_offset = self.opt.top_thickness - 5
-                mx_leg_h = 3.3
-                # height from bottom of lid, to bottom of switch stem
-                strut_h = bot_of_stem_offset + self.opt.bot_thickness - mx_leg_h
-                strut_height_adjust = self.opt.strut_height_adjust
-                strut_h += strut_height_adjust
-                self.lid += translate([x, y, 0])(
-                    cylinder(r1 = 10/2, r2 = 5/2, h=strut_h)
-                )
+                strut_positions.append([x, y, 0])
+
+            switch_positions.append([x, y, angle])
+        self.timer.mark("keys")
 
-            # Create the hole for the key switch
-            self.case -= create_switch_hole(x, y, angle, top_thickness, hole_size=hole_size)
+        feature_table = self.feature_table.compile()
+        self.features = features.board_shapes(self.feature_table, feature_table)
+        if self.opt.pcb_mounting_holes:
+            for module in features.pcb_modules(feature_table):
+                self.kb_pcb.add_module(module)
+        self.timer.mark("features")
 
-        case = mirror([0, 1, 0])(self.case.generate())
-        lid = mirror([0, 1, 0])(self.lid.generate())
+        if not parts:
+            return (None, None)
 
-        return (case, lid)
+        self.case_builder.add_switches(switch_positions, strut_positions)
+        self.case_builder.add_scad_features(feature_table)
+        self.timer.mark("case features")
+
+        return self.case_builder.generate()
 
     def animate(self):
         case, lid = self.generate()
+        self.case_builder.animate(
+            case, lid,
+            "%s/%s"%(script_path, os.path.join("test_pcb","test_anim.scad"))
+        )
 
-        def _animate(_time=0):
-            t = _time * 2
-            parts = part()(
-                part()(color("yellow")(case)),
-                translate([0, 0, -(self.opt.bot_thickness + (7)*t)])(
-                    part()(color("red")(lid))
-                )
-            )
+    def check_collisions(self):
+        """
+        Returns a list of messages for directives that collide with switch
+        holes or switch pads.
+        """
+        hole_index = collision.ShapeIndex(
+            [hole[0] for (_, hole) in self.switch_holes],
+            ["switch hole of " + ref for (ref, _) in self.switch_holes]
+        )
+        pad_index = self.kb_pcb.get_pad_index()
+
+        result = []
+        for (name, shape, top, pcb, _) in self.features:
+            hits = []
+            if top:
+                hits += hole_index.find_collisions(shape)
+            if pcb:
+                hits += pad_index.find_collisions(shape)
+            if hits:
+                # footprints have several pads with the same name
+                hits = sorted(set(hits), key=hits.index)
+                result.append("{} at ({:.2f}, {:.2f}) collides with {}".format(
+                    name, shape.center[0], shape.center[1], ", ".join(hits)
+                ))
+        return result
 
-            return parts
+    def check_walls(self):
+        """
+        Returns a list of places where the walls of the top plate are
+        thinner than `--min-wall`.
+        """
+        holes = [
+            ("switch hole of " + ref, hole, False) for (ref, hole) in self.switch_holes
+        ]
+        # directives like ports are allowed to cut through the case edge
+        holes += [
+            (name, [shape], True) for (name, shape, top, _, add) in self.features
+            if top and not add
+        ]
+        return wall_thickness.find_thin_walls(
+            self.plate_outline, holes, self.opt.min_wall
+        )
 
-        scad_render_animated_file(
-            _animate,
-            steps=60,   # Number of steps to create one complete motion
-            back_and_forth=True,
-            filepath="%s/%s"%(script_path, os.path.join("test_pcb","test_anim.scad"))
+    def check_layout(self):
+        """
+        Check the generated layout for problems, printing a warning for each
+        one found. Returns True if no problems were found.
+        """
+        violations = self.kb_pcb.check_clearance(
+            self.opt.pad_clearance,
+            self.opt.drill_clearance
         )
+        violations += self.check_collisions()
+        violations += self.check_walls()
+        for violation in violations:
+            print("Warning: " + str(violation), file=sys.stderr)
+        return len(violations) == 0
 
     def generate_to_file(self, file_name=None):
         if file_name == None:
             file_name = os.path.basename(self.opt.kle_json_file).strip(".json")
 
-        case, lid = self.generate()
-        parts = part()(
-            part()(color("yellow")(case)),
-            down(self.opt.bot_thickness + self.opt.lid_thickness + 7)(
-                part()(color("red")(lid))
-            )
+        artifacts = self.opt.only
+        if artifacts == None:
+            artifacts = ARTIFACTS
+        # the parts file has both the case and the lid
+        parts_needed = tuple(
+            name for name in ('case', 'lid')
+            if name in artifacts or 'parts' in artifacts
         )
-        if self.opt.xcuts != None:
-            xcuts = self.opt.xcuts
-            number_of_cuts = len(xcuts)
-            xcuts = ["-1000.0"] + xcuts + ["1000.0"]
-            xcuts = [float(x)*self.opt.spacing for x in xcuts]
-            number_of_segments = number_of_cuts + 1
-            for i in range(number_of_segments):
-                start_x = xcuts[i]
-                end_x = xcuts[i+1]
-                width_of_cut = end_x - start_x
-
-                part_volume = translate([start_x+width_of_cut/2, 0, 0])(
-                    cube([width_of_cut, 999999, 999999], center=True)
-                )
 
-                case_part_i = intersection()(
-                    part_volume,
-                    case
-                )
-                lid_part_i = intersection()(
-                    part_volume,
-                    lid
-                )
-                scad_render_to_file(
-                    case_part_i,
-                    "{}-case-{}.scad".format(file_name, i),
-                    include_orig_code=False
-                )
-                scad_render_to_file(
-                    lid_part_i,
-                    "{}-lid-{}.scad".format(file_name, i),
-                    include_orig_code=False
-                )
-        self.kb_pcb.write_to_file( file_name+"-pcb"+".kicad_pcb")
-        scad_render_to_file(case,  file_name+"-case"+".scad", include_orig_code=False)
-        scad_render_to_file(lid,   file_name+"-lid"+".scad", include_orig_code=False)
-        scad_render_to_file(parts, file_name+"-parts"+".scad", include_orig_code=False)
-        return parts
+        case, lid = self.generate(parts=parts_needed)
+        checks_ok = self.check_layout()
+        self.timer.mark("checks")
+        if parts_needed:
+            checks_ok = self.case_builder.check_render_cost([
+                (name, obj) for (name, obj) in [("case", case), ("lid", lid)]
+                if name in parts_needed
+            ]) and checks_ok
+            self.timer.mark("render cost")
+        if not checks_ok and self.opt.strict_checks:
+            print("Error: layout checks failed", file=sys.stderr)
+            sys.exit(1)
+
+        if 'pcb' in artifacts:
+            self.kb_pcb.write_to_file(
+                file_name+"-pcb"+".kicad_pcb",
+                update=self.opt.pcb_update
+            )
+            self.kb_pcb.write_pos_file(file_name+"-pcb"+".pos")
+            self.timer.mark("write pcb")
+        if not parts_needed:
+            return None
+        return self.case_builder.write_files(file_name, artifacts, case, lid)
 
 
 
-if __name__ == "__main__":
+
+def main():
     import argparse
-    import json
-    import yaml
+    import tessellation
+
+    timer = StageTimer(START_TIME)
 
     parser = argparse.ArgumentParser(description='KLE -> 3D printed plate generator')
     parser.add_argument('kle_json_file', type=str, action='store',
@@ -799,28 +580,100 @@ if __name__ == "__main__":
                         default=1,
                         help="Increases the point density for the case outline "
                         "algorithm."),
+    parser.add_argument('--outline-tolerance', type=float, action='store',
+                        default=0.02,
+                        help="The case and pcb outlines are simplified by "
+                        "removing points that are closer than this to the "
+                        "outline. Collinear points are always removed."),
+    parser.add_argument('--pcb-arc-tolerance', type=float, action='store',
+                        default=0,
+                        help="Curved parts of the pcb outline that are within "
+                        "this distance of a circle are written as arcs. The "
+                        "default of 0 only uses straight lines."),
     parser.add_argument('--plate-only', type=bool, action='store',
                         default=False,
                         help="Only generate the plate"),
     parser.add_argument('--corner-type', type=str, action='store',
                         default='cylinder',
-                        help="The type of corners to be used when constructing the case."),
+                        help="The type of corners to be used when constructing "
+                        "the case: cylinder, spherical or rectangular."),
     parser.add_argument('--segments', type=int, action='store',
                         default=20,
-                        help="The type of corners to be used when constructing the case."),
+                        help="The most segments used for a full circle."),
+    parser.add_argument('--chord-tolerance', type=float, action='store',
+                        default=tessellation.DEFAULT_CHORD_TOLERANCE,
+                        help="The largest distance in mm between a curve and "
+                        "the segments drawing it. Sets the number of segments "
+                        "of each curve from its radius."),
+    parser.add_argument('--max-facets', type=int, action='store',
+                        default=20000,
+                        help="Loosen --chord-tolerance when the curves of the "
+                        "case would have more facets than this in total, 0 to "
+                        "disable."),
     parser.add_argument('--fast', type=bool, action='store',
                         default=False,
-                        help="The type of corners to be used when constructing the case."),
+                        help="Generate a quick preview of the case. Curves "
+                        "use fewer segments and the case corners aren't "
+                        "rounded. Clip notches and lid struts are left out."),
+    parser.add_argument('--only', type=artifact_list, action='store',
+                        default=None,
+                        help="Only generate these outputs, as a comma "
+                        "separated list of: pcb, case, lid, parts. Stages "
+                        "that none of them need are skipped, for example "
+                        "only the pcb doesn't build the 3D case, and only "
+                        "the lid leaves out the switch holes and the case "
+                        "features."),
     parser.add_argument('--strut-height-adjust', type=float, action='store',
                         default=0.3,
                         help="Adjust the height of struts. Struts are supports "
                         "added to the lid that push against the middle leg of "
                         "a cherry switch."),
 
+    parser.add_argument('--pcb-update', type=bool, action='store',
+                        default=False,
+                        help="Update the footprint positions and outline of an "
+                        "existing PCB file in place instead of overwriting it. "
+                        "This keeps any routing done on the board."),
+    parser.add_argument('--pcb-mounting-holes', type=bool, action='store',
+                        default=False,
+                        help="Add a mounting hole footprint to the pcb for "
+                        "each screw directive that goes through it."),
+
+    parser.add_argument('--pad-clearance', type=float, action='store',
+                        default=pcbnew_drc.DEFAULT_PAD_CLEARANCE,
+                        help="Minimum copper clearance between pads of "
+                        "different switches."),
+    parser.add_argument('--drill-clearance', type=float, action='store',
+                        default=pcbnew_drc.DEFAULT_DRILL_CLEARANCE,
+                        help="Minimum distance between the edges of drill "
+                        "holes of different switches."),
+    parser.add_argument('--min-wall', type=float, action='store',
+                        default=0.8,
+                        help="Warn about walls in the top plate that are "
+                        "thinner than this."),
+    parser.add_argument('--strict-checks', type=bool, action='store',
+                        default=False,
+                        help="Exit with an error instead of generating output "
+                        "files when the layout checks find a problem."),
+    parser.add_argument('--render-budget', type=float, action='store',
+                        default=2e6,
+                        help="Warn when the estimated CGAL render cost of the "
+                        "case or lid is over this, 0 to disable. Use "
+                        "--render-report to see the estimates."),
+    parser.add_argument('--render-report', type=bool, action='store',
+                        default=False,
+                        help="Print the estimated render cost and the node "
+                        "counts of the case and lid."),
+
+    parser.add_argument('--timing', type=bool, action='store',
+                        default=False,
+                        help="Print the time taken by each stage of the run."),
+
     parser.add_argument('--xcuts', type=str, action='store', nargs="+",
                         help="Slice the model into parts for 3D printing")
 
     args = parser.parse_args()
+    timer.mark("startup")
 
     base_name = os.path.basename(args.kle_json_file)
     base_name, file_ext = os.path.splitext(base_name)
@@ -832,29 +685,36 @@ if __name__ == "__main__":
             if exc.errno != errno.EEXIST:
                 raise
 
-    json_layout = None
-    with open(args.kle_json_file, encoding="utf-8") as json_file:
-        json_file_contents = json_file.read()
-        if file_ext == ".json":
-            json_layout = json.loads(json_file_contents)
-        elif file_ext == ".yaml":
-            json_layout = yaml.load(json_file_contents)
-
-    if isinstance(json_layout, dict):
-        opts = json_layout["options"]
-        layout = json_layout["layout"]
-        arg_str = args.kle_json_file + " "
-        for key in opts:
-            arg_str +=  "--{} {} ".format(key, opts[key])
-        args = parser.parse_args(arg_str.split())
-
-        json_layout = layout
-
+    cache_file = os.path.join(build_dir, base_name + ".layout-cache")
+    layout = layout_cache.load_layout(args.kle_json_file, cache_file)
+
+    if layout.options:
+        # Options in the layout file replace the defaults, and options given
+        # on the command line replace both.
+        known_options = vars(args)
+        defaults = {}
+        for (key, value) in layout.options.items():
+            name = key.replace("-", "_")
+            if name not in known_options or name == "kle_json_file":
+                parser.error("unknown option in {}: {}".format(
+                    args.kle_json_file, key
+                ))
+            defaults[name] = value
+        parser.set_defaults(**defaults)
+        args = parser.parse_args()
 
     file_name_prefix = os.path.join(build_dir, base_name)
 
-    kb_builder = KeyboardBuilder(json_layout, args)
+    timer.mark("load layout")
+
+    kb_builder = KeyboardBuilder(None, args, timer, layout=layout)
+    layout_cache.save_layout(layout, cache_file)
+    timer.mark("parse keys")
 
-    scad_obj = kb_builder.generate_to_file(file_name_prefix)
+    kb_builder.generate_to_file(file_name_prefix)
+    if args.timing:
+        print("Time per stage:")
+        print("    " + str(timer).replace("\n", "\n    "))
 
-    scad_code = scad_render(scad_obj)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Pad and drill clearance checks between footprints placed on a board.
+
+Pads and holes are treated as circles, so the checks are exact for the round
+pads used by the switch footprints and conservative for other shapes. Only
+pairs from different footprints are checked; the spacing inside a footprint
+is fixed by the footprint library.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+
+# KiCad's default board design rules
+DEFAULT_PAD_CLEARANCE = 0.2
+DEFAULT_DRILL_CLEARANCE = 0.25
+
+class ClearanceViolation(object):
+    def __init__(self, kind, module_a, pad_a, module_b, pad_b, gap, clearance):
+        self.kind = kind
+        self.module_a = module_a
+        self.pad_a = pad_a
+        self.module_b = module_b
+        self.pad_b = pad_b
+        self.gap = gap
+        self.clearance = clearance
+
+    def __str__(self):
+        def _pad_str(pad):
+            return "pad {}".format(pad) if pad else "hole"
+        return "{} clearance between {} {} and {} {} is {:.3f}mm, need {:.3f}mm".format(
+            self.kind,
+            self.module_a, _pad_str(self.pad_a),
+            self.module_b, _pad_str(self.pad_b),
+            self.gap, self.clearance
+        )
+
+def _find_close_circles(centers, radii, owners, clearance):
+    """
+    Returns `(i, j, gap)` arrays for all pairs of circles with different
+    owners whose edges are closer than `clearance`.
+    """
+    if len(centers) < 2:
+        empty = np.zeros(0, dtype=int)
+        return empty, empty, np.zeros(0)
+
+    from scipy.spatial import cKDTree
+    tree = cKDTree(centers)
+    search_radius = 2.0 * radii.max() + clearance
+    pairs = tree.query_pairs(search_radius, output_type='ndarray')
+    if len(pairs) == 0:
+        empty = np.zeros(0, dtype=int)
+        return empty, empty, np.zeros(0)
+
+    i, j = pairs[:, 0], pairs[:, 1]
+    dist = np.linalg.norm(centers[i] - centers[j], axis=1)
+    gap = dist - radii[i] - radii[j]
+    mask = (owners[i] != owners[j]) & (gap < clearance)
+    return i[mask], j[mask], gap[mask]
+
+def _worst_per_module_pair(kind, geometry, index, i, j, gap, clearance):
+    # Report one violation per pair of footprints, the closest one
+    worst = {}
+    for (a, b, g) in zip(index[i], index[j], gap):
+        mod_a = geometry.pad_module[a]
+        mod_b = geometry.pad_module[b]
+        if mod_a > mod_b:
+            (a, b, mod_a, mod_b) = (b, a, mod_b, mod_a)
+        key = (mod_a, mod_b)
+        if key not in worst or g < worst[key][2]:
+            worst[key] = (a, b, g)
+
+    modules = geometry.modules
+    result = []
+    for key in sorted(worst):
+        (a, b, g) = worst[key]
+        result.append(ClearanceViolation(
+            kind,
+            modules[key[0]].get_reference(), geometry.pad_names[a],
+            modules[key[1]].get_reference(), geometry.pad_names[b],
+            g, clearance
+        ))
+    return result
+
+def check_pad_clearance(geometry, clearance=DEFAULT_PAD_CLEARANCE):
+    """
+    Check the copper to copper clearance of the plated pads in the
+    `BoardGeometry`.
+    """
+    index = np.nonzero(geometry.pad_plated)[0]
+    centers = geometry.pad_centers[index]
+    radii = geometry.pad_sizes[index].max(axis=1) / 2.0
+    owners = geometry.pad_module[index]
+    (i, j, gap) = _find_close_circles(centers, radii, owners, clearance)
+    return _worst_per_module_pair("Pad", geometry, index, i, j, gap, clearance)
+
+def check_drill_clearance(geometry, clearance=DEFAULT_DRILL_CLEARANCE):
+    """
+    Check the hole to hole clearance of all drills in the `BoardGeometry`.
+    """
+    index = np.nonzero(geometry.pad_drills > 0.0)[0]
+    centers = geometry.pad_centers[index]
+    radii = geometry.pad_drills[index] / 2.0
+    owners = geometry.pad_module[index]
+    (i, j, gap) = _find_close_circles(centers, radii, owners, clearance)
+    return _worst_per_module_pair("Drill", geometry, index, i, j, gap, clearance)
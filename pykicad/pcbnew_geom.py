@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Absolute geometry of placed footprints computed in bulk with numpy.
+
+The pads and lines of a footprint are stored relative to the footprint
+position. Rather than walking every placed module, the local geometry of
+each prototype is converted to arrays once, and all placements of that
+prototype are transformed with a single matrix multiply.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import datetime
+
+import numpy as np
+
+import pykicad.pcbnew_obj as pcbnew_obj
+
+PLACEMENT_DTYPE = np.dtype([
+    ('x', 'f8'),
+    ('y', 'f8'),
+    ('angle', 'f8'),
+    ('flip', '?'),
+])
+
+def placement_array(rows):
+    """
+    Create a placement array from a list of `(x, y, angle, flip)` tuples.
+    """
+    return np.array([tuple(row) for row in rows], dtype=PLACEMENT_DTYPE)
+
+def placement_matrices(placements):
+    """
+    Returns the `(N, 2, 2)` linear part of the transform from footprint to
+    board coordinates for each placement.
+
+    KiCad uses a y-down coordinate system, where a positive angle rotates
+    counter-clockwise on screen. A flipped footprint is mirrored in y before
+    it is rotated.
+    """
+    theta = np.radians(placements['angle'])
+    cos = np.cos(theta)
+    sin = np.sin(theta)
+    flip = np.where(placements['flip'], -1.0, 1.0)
+
+    result = np.empty((len(placements), 2, 2))
+    result[:, 0, 0] = cos
+    result[:, 0, 1] = sin * flip
+    result[:, 1, 0] = -sin
+    result[:, 1, 1] = cos * flip
+    return result
+
+def _transform_points(matrices, offsets, points):
+    """ (N, 2, 2), (N, 2), (P, 2) -> (N, P, 2) """
+    return np.einsum('nij,pj->npi', matrices, points) + offsets[:, np.newaxis, :]
+
+class PlacedGeometry(object):
+    """
+    Absolute geometry for `N` placements of a footprint with `P` pads and
+    `L` lines. All arrays have the placement as their first axis.
+    """
+    def __init__(self, footprint, placements):
+        self.footprint = footprint
+        self.placements = placements
+
+        matrices = placement_matrices(placements)
+        offsets = np.stack([placements['x'], placements['y']], axis=-1)
+
+        # pads
+        self.pad_centers = _transform_points(matrices, offsets, footprint.pad_pos)
+        self.pad_angles = footprint.pad_angle[np.newaxis, :] + \
+            placements['angle'][:, np.newaxis]
+        self.pad_sizes = np.broadcast_to(
+            footprint.pad_size, (len(placements),) + footprint.pad_size.shape
+        )
+        self.pad_drills = np.broadcast_to(
+            footprint.pad_drill, (len(placements),) + footprint.pad_drill.shape
+        )
+
+        # lines
+        self.line_starts = _transform_points(matrices, offsets, footprint.line_start)
+        self.line_ends = _transform_points(matrices, offsets, footprint.line_end)
+
+class FootprintGeometry(object):
+    """
+    The local pad and line geometry of a footprint as numpy arrays.
+    """
+
+    def __init__(self, module):
+        module_angle = module.pos.a
+        pads = [obj for obj in module.objects if isinstance(obj, pcbnew_obj.Pad)]
+        lines = [obj for obj in module.objects if isinstance(obj, pcbnew_obj.LineCommon)]
+
+        self.pad_pos = np.array(
+            [[pad.pos.x, pad.pos.y] for pad in pads], dtype=float
+        ).reshape(-1, 2)
+        self.pad_angle = np.array(
+            [pad.pos.a - module_angle for pad in pads], dtype=float
+        )
+        self.pad_size = np.array(
+            [[pad.size.x, pad.size.y] if pad.size else [0.0, 0.0] for pad in pads],
+            dtype=float
+        ).reshape(-1, 2)
+        # Only round holes are parsed, so the drill is a diameter
+        self.pad_drill = np.array(
+            [pad.drill.x if pad.drill else 0.0 for pad in pads], dtype=float
+        )
+        self.pad_plated = np.array(
+            [pad.kind != "np_thru_hole" for pad in pads], dtype=bool
+        )
+        self.pad_names = [_atom_str(pad.pin) if pad.pin else "" for pad in pads]
+
+        self.line_start = np.array(
+            [[line.start.x, line.start.y] for line in lines], dtype=float
+        ).reshape(-1, 2)
+        self.line_end = np.array(
+            [[line.end.x, line.end.y] for line in lines], dtype=float
+        ).reshape(-1, 2)
+        self.line_layers = [line.layer for line in lines]
+
+    def transform(self, placements):
+        return PlacedGeometry(self, placements)
+
+def group_placements(modules):
+    """
+    Group placed modules by the footprint they were placed from.
+
+    Returns a list of `(prototype, indices, placements)`, where `indices` are
+    the positions of the modules in `modules`.
+    """
+    groups = {}
+    order = []
+    for (i, module) in enumerate(modules):
+        if isinstance(module, pcbnew_obj.ModuleInstance) and module._objects == None:
+            prototype = module.base
+            flip = module.flipped
+            angle = module.pos.a
+        else:
+            # modules that own their children are their own prototype
+            prototype = module
+            flip = False
+            angle = module.pos.a
+        key = id(prototype)
+        if key not in groups:
+            groups[key] = (prototype, [], [])
+            order.append(key)
+        groups[key][1].append(i)
+        groups[key][2].append((module.pos.x, module.pos.y, angle, flip))
+
+    return [
+        (groups[key][0], np.array(groups[key][1], dtype=int), placement_array(groups[key][2]))
+        for key in order
+    ]
+
+class BoardGeometry(object):
+    """
+    Absolute pad and line geometry of all modules on a board, flattened into
+    one row per pad and one row per line.
+
+    `pad_module` and `line_module` give the index of the module in `modules`
+    that each row belongs to.
+    """
+
+    def __init__(self, modules):
+        self.modules = modules
+        self._footprints = {}
+
+        pad_parts = {
+            'center': [], 'size': [], 'angle': [], 'drill': [], 'plated': [],
+            'module': [], 'name': []
+        }
+        line_parts = {'start': [], 'end': [], 'module': [], 'layer': []}
+
+        for (prototype, indices, placements) in group_placements(modules):
+            footprint = self._get_footprint(prototype)
+            placed = footprint.transform(placements)
+            num_pads = len(footprint.pad_pos)
+            num_lines = len(footprint.line_start)
+
+            pad_parts['center'].append(placed.pad_centers.reshape(-1, 2))
+            pad_parts['size'].append(placed.pad_sizes.reshape(-1, 2))
+            pad_parts['angle'].append(placed.pad_angles.reshape(-1))
+            pad_parts['drill'].append(placed.pad_drills.reshape(-1))
+            pad_parts['plated'].append(np.tile(footprint.pad_plated, len(indices)))
+            pad_parts['module'].append(np.repeat(indices, num_pads))
+            pad_parts['name'] += footprint.pad_names * len(indices)
+
+            line_parts['start'].append(placed.line_starts.reshape(-1, 2))
+            line_parts['end'].append(placed.line_ends.reshape(-1, 2))
+            line_parts['module'].append(np.repeat(indices, num_lines))
+            line_parts['layer'] += footprint.line_layers * len(indices)
+
+        def _concat(parts, shape, dtype=float):
+            if not parts:
+                return np.zeros(shape, dtype=dtype)
+            return np.concatenate(parts)
+
+        self.pad_centers = _concat(pad_parts['center'], (0, 2))
+        self.pad_sizes = _concat(pad_parts['size'], (0, 2))
+        self.pad_angles = _concat(pad_parts['angle'], (0,))
+        self.pad_drills = _concat(pad_parts['drill'], (0,))
+        self.pad_plated = _concat(pad_parts['plated'], (0,), dtype=bool)
+        self.pad_module = _concat(pad_parts['module'], (0,), dtype=int)
+        self.pad_names = pad_parts['name']
+
+        self.line_starts = _concat(line_parts['start'], (0, 2))
+        self.line_ends = _concat(line_parts['end'], (0, 2))
+        self.line_module = _concat(line_parts['module'], (0,), dtype=int)
+        self.line_layers = line_parts['layer']
+
+    def _get_footprint(self, prototype):
+        key = id(prototype)
+        if key not in self._footprints:
+            self._footprints[key] = FootprintGeometry(prototype)
+        return self._footprints[key]
+
+def _atom_str(value):
+    # the parser can leave single atoms wrapped in a list
+    if not isinstance(value, str) and len(value) == 1:
+        value = value[0]
+    return str(value)
+
+def _module_value(module):
+    if isinstance(module, pcbnew_obj.ModuleInstance) and module._objects == None:
+        objects = module._prototype.objects
+    else:
+        objects = module.objects
+    for obj in objects:
+        if type(obj) == pcbnew_obj.FP_Text and obj.kind == "value":
+            return _atom_str(obj.text)
+    return ""
+
+def write_pos_file(out, modules):
+    """
+    Write a KiCad style ASCII position (pick and place) file for `modules`
+    to the file like object `out`.
+    """
+    x = np.array([module.pos.x for module in modules], dtype=float)
+    y = np.array([module.pos.y for module in modules], dtype=float)
+    angle = np.array([module.pos.a for module in modules], dtype=float) % 360.0
+    bottom = np.array(
+        [getattr(module, "flipped", False) for module in modules], dtype=bool
+    )
+
+    out.write("### Module positions - created on {} ###\n".format(
+        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ))
+    out.write("### Printed by pykicad\n")
+    out.write("## Unit = mm, Angle = deg.\n")
+    out.write("## Side : All\n")
+    out.write("# {:<10} {:<15} {:<40} {:>10} {:>10} {:>9}  {}\n".format(
+        "Ref", "Val", "Package", "PosX", "PosY", "Rot", "Side"
+    ))
+    # KiCad position files use a y-up coordinate system
+    for (i, module) in enumerate(modules):
+        out.write("{:<12} {:<15} {:<40} {:>10.4f} {:>10.4f} {:>9.4f}  {}\n".format(
+            module.get_reference(),
+            _module_value(module),
+            _atom_str(module.component),
+            x[i],
+            -y[i] + 0.0,
+            angle[i],
+            "bottom" if bottom[i] else "top",
+        ))
+    out.write("## End\n")
@@ -6,11 +6,19 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import copy
+import io
 
 # import parse_objs
 import re
 import sys
 
+# KiCad stores all lengths as integer nanometers, so there is no point writing
+# more digits than this.
+NUM_PRECISION = 6
+
+# Size of the write buffer used when streaming a board to a file
+WRITE_BUFFER_SIZE = 1 << 16
+
 def sanitize_str(s):
     if s == "":
         return '""'
@@ -22,8 +30,19 @@ def sanitize_str(s):
 def gen_indent(depth):
     return "  " * depth
 
+def format_num(value):
+    """
+    Format a number with a fixed precision and without trailing zeros.
+    """
+    if isinstance(value, int):
+        return str(value)
+    result = "{:.{}f}".format(value, NUM_PRECISION).rstrip("0").rstrip(".")
+    if result == "-0":
+        result = "0"
+    return result
 
-def flipped_layer_str(layer_str):
+
+def _flip_layer_name(layer_str):
         matches = re.match("([FB])\.(.*)", layer_str)
         if not matches:
             return layer_str
@@ -38,11 +57,26 @@ def flipped_layer_str(layer_str):
 
         return layer_side + '.' + layer_name
 
+# Lookup table for flipping layers between the front and back of the board.
+# Layer names not in the table are added the first time they are flipped.
+FLIPPED_LAYERS = {}
+for _name in ["Cu", "Adhes", "Paste", "SilkS", "Mask", "CrtYd", "Fab"]:
+    FLIPPED_LAYERS["F." + _name] = "B." + _name
+    FLIPPED_LAYERS["B." + _name] = "F." + _name
+
+def flipped_layer_str(layer_str):
+    try:
+        return FLIPPED_LAYERS[layer_str]
+    except KeyError:
+        result = _flip_layer_name(layer_str)
+        FLIPPED_LAYERS[layer_str] = result
+        return result
+
 def generate_paren_value(value):
     if isinstance(value, str):
         return sanitize_str(value)
     elif isinstance(value, (int, float)):
-        return str(value)
+        return format_num(value)
     elif isinstance(value, (list, tuple)):
         if len(value) == 0:
             return ""
@@ -66,11 +100,23 @@ class PCBObjectTypeError(Exception):
         )
 
 class PCBObject(object):
-    pass
+    # Every object implements `write(out, indent_depth=0)` which streams its
+    # text to the file like object `out`. `generate()` collects it in a string.
+
+    # The small value types below are created in large numbers when parsing
+    # and placing footprints, so they define `__slots__` instead of using an
+    # attribute dict.
+    __slots__ = ()
+
+    def generate(self, indent_depth=0):
+        out = io.StringIO()
+        self.write(out, indent_depth=indent_depth)
+        return out.getvalue()
+
     # def __str__(self):
     #     return self.generate()
 
-class PCBObjectContainer(object):
+class PCBObjectContainer(PCBObject):
     def __init__(self):
         self.objects = []
 
@@ -87,13 +133,18 @@ class PCBObjectContainer(object):
                 self.objects.append(item)
 
     def gen_objects(self, indent_depth=0):
+        out = io.StringIO()
+        self.write_objects(out, indent_depth=indent_depth)
+        return out.getvalue()
+
+    def write_objects(self, out, indent_depth=0):
         iter_obj = iter(self.objects)
         # indent_str = gen_indent(indent_depth)
         indent_depth += 1
-        result = next(iter_obj).generate(indent_depth=indent_depth)
+        next(iter_obj).write(out, indent_depth=indent_depth)
         for obj in iter_obj:
-            result += "\n" + obj.generate(indent_depth=indent_depth)
-        return result
+            out.write("\n")
+            obj.write(out, indent_depth=indent_depth)
 
 class PCBDocument(PCBObjectContainer):
     def __init__(self, version=4, host="pcbnew 4.0.7"):
@@ -102,18 +153,22 @@ class PCBDocument(PCBObjectContainer):
         self.host = host
         self.general = PCBGeneral()
 
-    def generate(self, indent_depth=0):
+    def write(self, out, indent_depth=0):
         # TODO: check what host field is used for
-        result = "(kicad_pcb (version {version}) (host {host})\n".format(
+        out.write("(kicad_pcb (version {version}) (host {host})\n".format(
             version = self.version,
             host = self.host
-        )
-        result += "\n"
-        result += self.general.generate()
-        result += "\n"
-        result += self.gen_objects(indent_depth=indent_depth)
-        result += "\n)"
-        return result
+        ))
+        out.write("\n")
+        self.general.write(out)
+        out.write("\n")
+        self.write_objects(out, indent_depth=indent_depth)
+        out.write("\n)")
+
+    def write_to_file(self, file_name):
+        with open(file_name, "w", encoding="utf-8",
+                  buffering=WRITE_BUFFER_SIZE) as out_file:
+            self.write(out_file)
 
 class PCBGeneral(PCBObject):
     OPTION_MAP = {
@@ -158,19 +213,18 @@ class PCBGeneral(PCBObject):
         assert(isinstance(value, (int, float)) and value > 0)
         self._options['thickness'] = value
 
-    def generate(self):
-        result = "(general \n"
+    def write(self, out, indent_depth=0):
+        out.write("(general \n")
         for key in self._options.keys():
-            result += generate_paren_statement(key, self._options[key]) + "\n"
-        result += ")"
-        return result
+            out.write(generate_paren_statement(key, self._options[key]) + "\n")
+        out.write(")")
 
 class Page(PCBObject):
     def __init__(self, page="A4"):
         self.page = page
 
-    def generate(self):
-        return "(page {page})".format(page=self.page)
+    def write(self, out, indent_depth=0):
+        out.write("(page {page})".format(page=self.page))
 
 class LayerList(PCBObject):
     def __init__(self, layers=[]):
@@ -201,27 +255,26 @@ class LayerList(PCBObject):
             (49 , "F.Fab"     , "user"),
         ])
 
-    def generate(self):
-        result = "(layers\n"
+    def write(self, out, indent_depth=0):
+        out.write("(layers\n")
         for layer in self.layers:
-            result += "({number} {name} {category})\n".format(
+            out.write("({number} {name} {category})\n".format(
                 number   = layer[0],
                 name     = sanitize_str(layer[1]),
                 category = layer[2],
-            )
-        result += ")"
-        return result
+            ))
+        out.write(")")
 
 class Net(PCBObject):
     def __init__(self, number, name):
         self.number = number
         self.name = sanitize_str(name)
 
-    def generate(self):
-        return "(net {number} {name})".format(
+    def write(self, out, indent_depth=0):
+        out.write("(net {number} {name})".format(
             number = self.number,
             name = sanitize_str(self.name),
-        )
+        ))
 
 class NetClass(PCBObjectContainer):
     def __init__(self, name, description):
@@ -246,19 +299,18 @@ class NetClass(PCBObjectContainer):
     def add_net(self, pcb_net):
         self.add_object(pcb_net)
 
-    def generate(self):
-        result = "(net_class {name} \"{description}\"\n".format(
+    def write(self, out, indent_depth=0):
+        out.write("(net_class {name} \"{description}\"\n".format(
             name = sanitize_str(self.name),
             description = self.description,
-        )
-        result += "(clearance {})\n".format(self.clearance)
-        result += "(trace_width {})\n".format(self.trace_width)
-        result += "(via_dia {})\n".format(self.via_dia)
-        result += "(via_drill {})\n".format(self.via_drill)
-        result += "(uvia_dia {})\n".format(self.uvia_dia)
-        result += "(uvia_drill {})\n".format(self.uvia_drill)
-        result += ")"
-        return result
+        ))
+        out.write("(clearance {})\n".format(format_num(self.clearance)))
+        out.write("(trace_width {})\n".format(format_num(self.trace_width)))
+        out.write("(via_dia {})\n".format(format_num(self.via_dia)))
+        out.write("(via_drill {})\n".format(format_num(self.via_drill)))
+        out.write("(uvia_dia {})\n".format(format_num(self.uvia_dia)))
+        out.write("(uvia_drill {})\n".format(format_num(self.uvia_drill)))
+        out.write(")")
 
 def _bool_str(x):
     if x:
@@ -290,21 +342,20 @@ class Setup(PCBObject):
 
         self.aux_axis_origin = [0, 0]
 
-    def generate(self):
-        result  = "(setup\n"
+    def write(self, out, indent_depth=0):
+        out.write("(setup\n")
 
         # via settings
-        result += "(via_size {})\n".format(self.via_size)
-        result += "(via_drill {})\n".format(self.via_drill)
-        result += "(via_min_size {})\n".format(self.via_min_size)
-        result += "(via_min_drill {})\n".format(self.via_min_drill)
+        out.write("(via_size {})\n".format(format_num(self.via_size)))
+        out.write("(via_drill {})\n".format(format_num(self.via_drill)))
+        out.write("(via_min_size {})\n".format(format_num(self.via_min_size)))
+        out.write("(via_min_drill {})\n".format(format_num(self.via_min_drill)))
         # μvia settings
-        result += "(uvia_size {})\n".format(self.uvia_size)
-        result += "(uvia_drill {})\n".format(self.uvia_drill)
-        result += "(uvia_min_size {})\n".format(self.uvia_min_size)
-        result += "(uvia_min_drill {})\n".format(self.uvia_min_drill)
-        result += ")"
-        return result
+        out.write("(uvia_size {})\n".format(format_num(self.uvia_size)))
+        out.write("(uvia_drill {})\n".format(format_num(self.uvia_drill)))
+        out.write("(uvia_min_size {})\n".format(format_num(self.uvia_min_size)))
+        out.write("(uvia_min_drill {})\n".format(format_num(self.uvia_min_drill)))
+        out.write(")")
 
 class Segment(PCBObject):
     def __init__(self, start, end, width, layer, net):
@@ -314,14 +365,14 @@ class Segment(PCBObject):
         self.layer = layer
         self.net = net
 
-    def generate(self):
-        return "(segment {start} {end} (width {width}) (layer {layer}) (net {net}))".format(
+    def write(self, out, indent_depth=0):
+        out.write("(segment {start} {end} (width {width}) (layer {layer}) (net {net}))".format(
             start = self.start.gen_start(),
             end = self.end.gen_end(),
-            width = self.width,
+            width = format_num(self.width),
             layer = self.layer,
             net = self.net.number
-        )
+        ))
 
 class Via(PCBObject):
     def __init__(self, pos, size, drill, net, layers=["F.Cu", "B.Cu"]):
@@ -331,14 +382,14 @@ class Via(PCBObject):
         self.net = net
         self.layers = layers
 
-    def generate(self):
-        return "(via {pos} (size {size}) {drill} (layers {layers}) (net {net}))".format(
+    def write(self, out, indent_depth=0):
+        out.write("(via {pos} (size {size}) {drill} (layers {layers}) (net {net}))".format(
             pos = self.pos.generate(),
-            size = self.size,
+            size = format_num(self.size),
             drill = self.drill.generate(),
             layers = " ".join(self.layers),
             net = self.net.number,
-        )
+        ))
 
 class Model(PCBObject):
     @staticmethod
@@ -358,16 +409,18 @@ class Model(PCBObject):
             self.rotate3d
         )
 
-    def generate(self, indent_depth=0):
-        indent_str = gen_indent(indent_depth)
-        return indent_str + "(model {path} {pos} {scale} {rotate})".format(
+    def write(self, out, indent_depth=0):
+        out.write(gen_indent(indent_depth))
+        out.write("(model {path} {pos} {scale} {rotate})".format(
             path = sanitize_str(self.path),
             pos = self.pos3d.gen_pos(),
             scale = self.scale3d.gen_scale(),
             rotate = self.rotate3d.gen_rotate(),
-        )
+        ))
 
 class Font(PCBObject):
+    __slots__ = ("size", "thickness")
+
     def __init__(self):
         self.size = None
         self.thickness = None
@@ -381,16 +434,20 @@ class Font(PCBObject):
             result.thickness = tokens.thickness[0]
         return result
 
-    def generate(self):
-        result = "(font"
+    def write(self, out, indent_depth=0):
+        out.write("(font")
         if self.size:
-            result += "  {}".format(self.size.generate())
+            out.write("  {}".format(self.size.generate()))
         if self.thickness:
-            result += " (thickness {})".format(self.thickness)
-        result += ")"
-        return result
+            out.write(" (thickness {})".format(format_num(self.thickness)))
+        out.write(")")
 
 class Effects(PCBObject):
+    __slots__ = ("font",)
+
+    def __init__(self):
+        self.font = None
+
     @staticmethod
     def from_tokens(tokens):
         result = Effects()
@@ -400,14 +457,16 @@ class Effects(PCBObject):
             result.font = None
         return result
 
-    def generate(self):
-        result = "(effects"
+    def write(self, out, indent_depth=0):
+        out.write("(effects")
         if self.font:
-            result += " {}".format(self.font.generate())
-        result += ")"
-        return result
+            out.write(" ")
+            self.font.write(out)
+        out.write(")")
 
 class FP_Text(PCBObject):
+    __slots__ = ("pos", "kind", "text", "layer", "effects")
+
     # def __init__(self, text, kind, pos, layer='F.SilkS', width=0.1):
     def __init__(self):
         pass
@@ -422,15 +481,16 @@ class FP_Text(PCBObject):
         result.effects = tokens.effects
         return result
 
-    def generate(self, indent_depth=0):
-        indent_str = gen_indent(indent_depth)
-        return indent_str + "(fp_text {kind} {text} {pos} (layer {layer}) {effects})".format(
+    def write(self, out, indent_depth=0):
+        out.write(gen_indent(indent_depth))
+        out.write("(fp_text {kind} {text} {pos} (layer {layer}) ".format(
             kind = self.kind,
             text = sanitize_str(self.text),
             pos = self.pos.generate(),
             layer = self.layer,
-            effects = self.effects.generate(),
-        )
+        ))
+        self.effects.write(out)
+        out.write(")")
 
     def flip(self):
         new_layer = flipped_layer_str(self.layer)
@@ -440,6 +500,8 @@ class FP_Text(PCBObject):
 
 
 class LineCommon(PCBObject):
+    __slots__ = ("start", "end", "layer", "width", "_keyword")
+
     def __init__(self, keyword, start=[0.0, 0.0], end=[0.0, 0.0], layer='F.SilkS', width=0.15):
         self.start = Pos(start[0], start[1])
         self.end = Pos(end[0], end[1])
@@ -462,15 +524,15 @@ class LineCommon(PCBObject):
         result.width = tokens.width[0]
         return result
 
-    def generate(self, indent_depth=0):
-        indent_str = gen_indent(indent_depth)
-        return indent_str + "({keyword} {start} {end} (layer {layer}) (width {width}))".format(
+    def write(self, out, indent_depth=0):
+        out.write(gen_indent(indent_depth))
+        out.write("({keyword} {start} {end} (layer {layer}) (width {width}))".format(
             keyword = self._keyword,
             start = self.start.gen_start(),
             end = self.end.gen_end(),
             layer=self.layer,
-            width=self.width,
-        )
+            width=format_num(self.width),
+        ))
 
     def flip(self):
         self.layer = flipped_layer_str(self.layer)
@@ -482,6 +544,8 @@ class LineCommon(PCBObject):
         return "{}({}, {}, {}, {})".format(self._keyword, self.start, self.end, self.layer, self.width)
 
 class FP_Line(LineCommon):
+    __slots__ = ()
+
     def __init__(self, start=[0.0,0.0], end=[0.0,0.0], layer='F.Cu', width=0.15):
         super(FP_Line, self).__init__("fp_line", start=start, end=end, layer=layer, width=width)
 
@@ -490,6 +554,8 @@ class FP_Line(LineCommon):
         return LineCommon.from_tokens("fp_line", tokens)
 
 class GR_Line(LineCommon):
+    __slots__ = ()
+
     def __init__(self, start=[0.0,0.0], end=[0.0,0.0], layer='F.SilkS', width=0.15):
         super(GR_Line, self).__init__("gr_line", start=start, end=end, layer=layer, width=width)
         self.generate()
@@ -498,6 +564,48 @@ class GR_Line(LineCommon):
     def from_tokens(tokens):
         return LineCommon.from_tokens("gr_line", tokens)
 
+class GR_Arc(LineCommon):
+    """
+    An arc drawn on the board. `start` is the center of the arc and `end` is
+    the point where the arc starts. The arc sweeps `angle` degrees from
+    there, clockwise on screen for positive angles.
+    """
+    __slots__ = ("angle",)
+
+    def __init__(self, start=[0.0,0.0], end=[0.0,0.0], angle=90.0, layer='F.SilkS', width=0.15):
+        super(GR_Arc, self).__init__("gr_arc", start=start, end=end, layer=layer, width=width)
+        self.angle = angle
+
+    @staticmethod
+    def from_tokens(tokens):
+        line = LineCommon.from_tokens("gr_arc", tokens)
+        return GR_Arc(
+            start = [line.start.x, line.start.y],
+            end = [line.end.x, line.end.y],
+            angle = tokens.angle[0],
+            layer = line.layer,
+            width = line.width,
+        )
+
+    def write(self, out, indent_depth=0):
+        out.write(gen_indent(indent_depth))
+        out.write("(gr_arc {start} {end} (angle {angle}) (layer {layer}) (width {width}))".format(
+            start = self.start.gen_start(),
+            end = self.end.gen_end(),
+            angle = format_num(self.angle),
+            layer = self.layer,
+            width = format_num(self.width),
+        ))
+
+    def flip(self):
+        super(GR_Arc, self).flip()
+        self.angle *= -1
+
+    def __str__(self):
+        return "gr_arc({}, {}, {}, {}, {})".format(
+            self.start, self.end, self.angle, self.layer, self.width
+        )
+
 class Module(PCBObjectContainer):
     def __init__(self):
         super(Module, self).__init__()
@@ -505,6 +613,8 @@ class Module(PCBObjectContainer):
         self.tags = None
         self.attr = None
         self.layer = None
+        # flipped copies of this module used by `place()`
+        self._variants = {}
 
     @staticmethod
     def from_tokens(tokens):
@@ -535,45 +645,68 @@ class Module(PCBObjectContainer):
         with open(file_name, encoding="utf-8") as mod_file:
             return Module.from_str(mod_file.read())
 
+    def add_object(self, obj):
+        self._variants = {}
+        super(Module, self).add_object(obj)
+
+    def _add_token_objects(self, tokens):
+        self._variants = {}
+        super(Module, self)._add_token_objects(tokens)
 
-    def generate(self, indent_depth=0):
+    def get_reference(self):
+        for obj in self.objects:
+            if type(obj) == FP_Text and obj.kind == "reference":
+                return obj.text
+        return None
+
+    def write(self, out, indent_depth=0):
         indent_str = gen_indent(indent_depth)
-        result = "\n"
-        result += indent_str + "(module {component} {pos} (layer {layer})\n".format(
+        out.write("\n")
+        out.write(indent_str + "(module {component} {pos} (layer {layer})\n".format(
             component = self.component,
             pos = self.pos.generate(),
             layer = self.layer,
-        )
+        ))
         indent_str = gen_indent(indent_depth+1)
         if self.description:
-            result += indent_str + "(descr \"{}\")\n".format(self.description)
+            out.write(indent_str + "(descr \"{}\")\n".format(self.description))
         if self.tags:
-            result += indent_str + "(tags \"{}\")\n".format(self.tags)
+            out.write(indent_str + "(tags \"{}\")\n".format(self.tags))
         if self.attr:
-            result += indent_str + "(attr {})\n".format(self.attr)
-        result += self.gen_objects(indent_depth=indent_depth)
+            out.write(indent_str + "(attr {})\n".format(self.attr))
+        self.write_objects(out, indent_depth=indent_depth)
         indent_str = gen_indent(indent_depth)
-        result += "\n" + indent_str + ")"
-        return result
+        out.write("\n" + indent_str + ")")
 
     def place(self, x, y, a=0.0, flip=False, ref="REF**"):
-        result = copy.deepcopy(self)
-        result.pos = Pos(x, y)
-
-        for obj in result.objects:
-            if type(obj) == FP_Text and obj.kind == "reference":
-                obj.text = ref
-
+        """
+        Returns a `ModuleInstance` of this footprint at the given position.
+        The instance shares the child objects of this module.
+        """
+        prototype = self.get_variant(flip)
         if flip:
-            result.flip()
             a += 180.0
 
-        if a != 0.0:
-            result.set_angle(a)
-
-        return result
+        return ModuleInstance(prototype, Pos(x, y, a), ref, base=self, flipped=flip)
+
+    def get_variant(self, flip):
+        """
+        Returns the prototype used to place this module on the front or the
+        back (`flip=True`) of the board. Each variant is only computed once.
+        """
+        if not flip:
+            return self
+        if flip not in self._variants:
+            variants = self._variants
+            self._variants = {}
+            variant = copy.deepcopy(self)
+            variant.flip()
+            variants[flip] = variant
+            self._variants = variants
+        return self._variants[flip]
 
     def flip(self):
+        self._variants = {}
         self.layer = flipped_layer_str(self.layer)
 
         for obj in self.objects:
@@ -581,6 +714,7 @@ class Module(PCBObjectContainer):
                 obj.flip()
 
     def set_angle(self, angle):
+        self._variants = {}
         old_angle = self.pos.a
         self.pos.a = angle
 
@@ -590,8 +724,96 @@ class Module(PCBObjectContainer):
             if hasattr(obj, "pos"):
                 obj.pos.a += angle_adj
 
+class ModuleInstance(Module):
+    """
+    A footprint placed on a board. Only the position and reference are stored
+    in the instance, the child objects are shared with the prototype module.
+
+    The children are copied the first time `objects` is accessed, so changes
+    made through it don't leak into the prototype or any other instances.
+    """
+
+    def __init__(self, prototype, pos, ref, base=None, flipped=False):
+        self._prototype = prototype
+        self._objects = None
+        self._variants = {}
+        self.pos = pos
+        self.ref = ref
+        # the unflipped module this instance was placed from
+        self.base = base if base != None else prototype
+        self.flipped = flipped
+        self.component = prototype.component
+        self.description = prototype.description
+        self.tags = prototype.tags
+        self.attr = prototype.attr
+        self.layer = prototype.layer
+
+    @property
+    def objects(self):
+        if self._objects == None:
+            self._objects = [
+                copy.deepcopy(self._place_object(obj))
+                for obj in self._prototype.objects
+            ]
+        return self._objects
+
+    @objects.setter
+    def objects(self, value):
+        self._variants = {}
+        self._objects = value
+
+    def _place_object(self, obj):
+        """
+        Returns `obj` as it appears in this instance. Objects that differ
+        from the prototype are shallow copies.
+        """
+        is_ref = type(obj) == FP_Text and obj.kind == "reference"
+        angle = self.pos.a
+        if not is_ref and (angle == 0.0 or not hasattr(obj, "pos")):
+            return obj
+
+        obj = copy.copy(obj)
+        if is_ref:
+            obj.text = self.ref
+        if angle != 0.0 and hasattr(obj, "pos"):
+            obj.pos = Pos(obj.pos.x, obj.pos.y, obj.pos.a + angle)
+        return obj
+
+    def flip(self):
+        super(ModuleInstance, self).flip()
+        self.flipped = not self.flipped
+
+    def set_angle(self, angle):
+        if self._objects == None and angle != self.pos.a:
+            # copy the children while they still match the old angle
+            self.objects
+        super(ModuleInstance, self).set_angle(angle)
+
+    def get_reference(self):
+        if self._objects == None:
+            return self.ref
+        return super(ModuleInstance, self).get_reference()
+
+    def place(self, x, y, a=0.0, flip=False, ref="REF**"):
+        if self._objects == None:
+            return self._prototype.place(x, y, a=a, flip=flip, ref=ref)
+        return super(ModuleInstance, self).place(x, y, a=a, flip=flip, ref=ref)
+
+    def write_objects(self, out, indent_depth=0):
+        if self._objects != None:
+            super(ModuleInstance, self).write_objects(out, indent_depth=indent_depth)
+            return
+
+        indent_depth += 1
+        for (i, obj) in enumerate(self._prototype.objects):
+            if i != 0:
+                out.write("\n")
+            self._place_object(obj).write(out, indent_depth=indent_depth)
+
 
 class Drill(PCBObject):
+    __slots__ = ("x", "y", "offset")
+
     def __init__(self, x, y=None, offset=None):
         self.x = x
         self.y = y
@@ -604,18 +826,19 @@ class Drill(PCBObject):
             result.x = tokens.r
         return result
 
-    def generate(self):
-        result = "(drill "
+    def write(self, out, indent_depth=0):
+        out.write("(drill ")
         if self.y == None: # Circular hole
-            result += "{}".format(self.x)
+            out.write(format_num(self.x))
         elif self.y != None: # Oval Hole
-            result += "oval {} {}".format(self.x, self.y)
+            out.write("oval {} {}".format(format_num(self.x), format_num(self.y)))
         if self.offset:
-            result += " " + self.offset.generate()
-        result += ")"
-        return result
+            out.write(" " + self.offset.generate())
+        out.write(")")
 
 class PCBObjectVec(PCBObject):
+    __slots__ = ("x", "y")
+
     def __init__(self, x=0.0, y=0.0):
         self.x = x
         self.y = y
@@ -626,11 +849,20 @@ class PCBObjectVec(PCBObject):
         if key == 1:
             return self.y
 
+    # The fields are immutable numbers, so a deep copy is a shallow copy
+    def __copy__(self):
+        return type(self)(self.x, self.y)
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
     def __str__(self):
         return "{}({}, {})".format(type(self).__name__, self.x, self.y)
     __repr__ = __str__
 
 class PCBObjectVec3(PCBObject):
+    __slots__ = ("x", "y", "z")
+
     def __init__(self, x=0.0, y=0.0, z=0.0):
         self.x = x
         self.y = y
@@ -644,23 +876,37 @@ class PCBObjectVec3(PCBObject):
         if key == 2:
             return self.z
 
+    def __copy__(self):
+        return type(self)(self.x, self.y, self.z)
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
     def __str__(self):
         return "{}({}, {}, {})".format(type(self).__name__, self.x, self.y, self.z)
     __repr__ = __str__
 
 class Offset(PCBObjectVec):
+    __slots__ = ()
+
     @staticmethod
     def from_tokens(tokens):
         return Offset(tokens[0], tokens[1])
 
-    def generate(self):
-        return "(offset {} {})".format(self.pos[0], self.pos[1])
+    def write(self, out, indent_depth=0):
+        out.write("(offset {} {})".format(format_num(self.x), format_num(self.y)))
 
 class Pos(PCBObjectVec):
+    __slots__ = ("a",)
+
     def __init__(self, x=0.0, y=0.0, a=0.0):
-        super(Pos, self).__init__(x, y)
+        self.x = x
+        self.y = y
         self.a = a
 
+    def __copy__(self):
+        return Pos(self.x, self.y, self.a)
+
     @staticmethod
     def from_tokens(tokens):
         a = 0.0
@@ -668,28 +914,40 @@ class Pos(PCBObjectVec):
             a = tokens[2]
         return Pos(tokens[0], tokens[1], a)
 
-    def generate(self):
+    def generate(self, indent_depth=0):
         if self.a != 0.0:
-            return "(at {} {} {})".format(self.x, self.y, self.a)
+            return "(at {} {} {})".format(
+                format_num(self.x), format_num(self.y), format_num(self.a)
+            )
         else:
-            return "(at {} {})".format(self.x, self.y)
+            return "(at {} {})".format(format_num(self.x), format_num(self.y))
+
+    def write(self, out, indent_depth=0):
+        out.write(self.generate())
 
     def gen_start(self):
-        return "(start {} {})".format(self.x, self.y)
+        return "(start {} {})".format(format_num(self.x), format_num(self.y))
 
     def gen_end(self):
-        return "(end {} {})".format(self.x, self.y)
+        return "(end {} {})".format(format_num(self.x), format_num(self.y))
 
     def __str__(self):
         return "Pos({}, {}, {})".format(self.x, self.y, self.a)
 
 class Vec3(PCBObjectVec3):
+    __slots__ = ()
+
     @staticmethod
     def from_tokens(tokens):
         return Vec3(tokens[0], tokens[1], tokens[2])
 
-    def generate(self):
-        return "(xyz {} {} {})".format(self.x, self.y, self.z)
+    def generate(self, indent_depth=0):
+        return "(xyz {} {} {})".format(
+            format_num(self.x), format_num(self.y), format_num(self.z)
+        )
+
+    def write(self, out, indent_depth=0):
+        out.write(self.generate())
 
     def gen_pos(self):
         return "(at {})".format(self.generate())
@@ -701,21 +959,33 @@ class Vec3(PCBObjectVec3):
         return "(rotate {})".format(self.generate())
 
 class Size(PCBObjectVec):
+    __slots__ = ()
+
     @staticmethod
     def from_tokens(tokens):
         return Size(tokens[0], tokens[1])
 
-    def generate(self):
-        return "(size {} {})".format(self.x, self.y)
+    def generate(self, indent_depth=0):
+        return "(size {} {})".format(format_num(self.x), format_num(self.y))
+
+    def write(self, out, indent_depth=0):
+        out.write(self.generate())
 
 class RectDelta(PCBObject):
     def __init__(self, x, y):
         self.delta = [x, y]
 
-    def generate(self):
-        return "(rect_delta {} {})".format(self.delta[0], self.delta[1])
+    def write(self, out, indent_depth=0):
+        out.write("(rect_delta {} {})".format(
+            format_num(self.delta[0]), format_num(self.delta[1])
+        ))
 
 class Pad(PCBObject):
+    __slots__ = (
+        "pin", "kind", "shape", "net", "pos", "size", "drill", "layers",
+        "rect_delta",
+    )
+
     def __init__(self):
         self.pin = ""
         self.kind = None
@@ -747,26 +1017,28 @@ class Pad(PCBObject):
             result.net = tokens.net
         return result
 
-    def generate(self, indent_depth=0):
-        indent_str = gen_indent(indent_depth)
-        result = indent_str + "(pad {pin} {kind} {shape} {pos}".format(
+    def write(self, out, indent_depth=0):
+        out.write(gen_indent(indent_depth))
+        out.write("(pad {pin} {kind} {shape} {pos}".format(
             pin = sanitize_str(self.pin),
             kind = self.kind,
             shape = self.shape,
             pos = self.pos.generate(),
-        )
+        ))
         if self.size:
-            result += " " + self.size.generate()
+            out.write(" " + self.size.generate())
         if self.layers:
-            result += " " + "(layers {})".format(" ".join(self.layers))
+            out.write(" " + "(layers {})".format(" ".join(self.layers)))
         if self.rect_delta:
-            result += " " + self.rect_delta.generate()
+            out.write(" ")
+            self.rect_delta.write(out)
         if self.drill:
-            result += " " + self.drill.generate()
+            out.write(" ")
+            self.drill.write(out)
         if self.net:
-            result += " " + self.net.generate()
-        result += ")"
-        return result
+            out.write(" ")
+            self.net.write(out)
+        out.write(")")
 
     def __str__(self):
         return "Pad({}, {}, {}, {}, {}, {})".format(
@@ -803,5 +1075,4 @@ if __name__ == "__main__":
                 newPCB += switch.place(x, y, ref=ref)
             # newPCB += smd_r.place(x, y+5)
 
-    with open("test_pcb.kicad_pcb", "w", encoding="utf-8") as out_file:
-        out_file.write(newPCB.generate())
+    newPCB.write_to_file("test_pcb.kicad_pcb")
@@ -270,6 +270,7 @@ CenterTok = _paren_stmt("center", FloatTok(), FloatTok())
 AngleTok = _paren_stmt("angle", FloatTok())
 GR_CircleTok = _paren_stmt("gr_circle", CenterTok, EndTok, LayerTok & WidthTok)
 GR_ArcTok = _paren_stmt("gr_arc", StartTok, EndTok, AngleTok, LayerTok & WidthTok)
+GR_ArcTok.addParseAction(pcbnew_obj.GR_Arc.from_tokens)
 GR_LineTok = _paren_stmt("gr_line", StartTok, EndTok, AngleTok & LayerTok & WidthTok)
 GR_LineTok.addParseAction(pcbnew_obj.GR_Line.from_tokens)
 
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Incrementally update an existing .kicad_pcb file from a `PCBDocument`.
+
+Footprints are matched by their reference (`SW0`, `SW1`, ...). Only the
+`(at ...)` fields of footprints that moved and the `Edge.Cuts` lines that
+changed are rewritten. Everything else in the file, including hand routed
+tracks, vias, zones and net assignments, is copied through byte for byte.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import re
+import sys
+
+import pykicad.pcbnew_obj as pcbnew_obj
+
+# Tolerance used when deciding if a coordinate in the old file has changed.
+# KiCad stores positions with a resolution of 1nm.
+POS_TOLERANCE = 1e-6
+
+EDGE_CUTS_LAYER = "Edge.Cuts"
+
+_TOKEN_RE = re.compile(rb'[()"]')
+_STRING_RE = re.compile(rb'"(?:[^"\\]|\\.)*"')
+_KEYWORD_RE = re.compile(rb'\(\s*([^\s()"]+)')
+_ATOM_RE = re.compile(rb'\s*("(?:[^"\\]|\\.)*"|[^\s()"]+)')
+
+class PCBUpdateError(Exception):
+    pass
+
+def _find_close(data, start):
+    """
+    Return the index one past the ')' that closes the '(' at `data[start]`.
+    """
+    depth = 0
+    pos = start
+    while True:
+        match = _TOKEN_RE.search(data, pos)
+        if match == None:
+            raise PCBUpdateError(
+                "Unbalanced parenthesis starting at byte {}".format(start)
+            )
+        char = match.group()
+        index = match.start()
+        if char == b'"':
+            str_match = _STRING_RE.match(data, index)
+            if not str_match:
+                raise PCBUpdateError(
+                    "Unterminated string at byte {}".format(index)
+                )
+            pos = str_match.end()
+            continue
+        if char == b'(':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        pos = index + 1
+
+def _iter_children(data, start, end):
+    """
+    Yield `(keyword, child_start, child_end)` for every parenthesized child
+    of the s-expression spanning `data[start:end]`.
+    """
+    pos = start + 1
+    while True:
+        match = _TOKEN_RE.search(data, pos, end - 1)
+        if match == None:
+            return
+        index = match.start()
+        char = match.group()
+        if char == b'"':
+            pos = _STRING_RE.match(data, index).end()
+            continue
+        if char == b')':
+            raise PCBUpdateError("Unexpected ')' at byte {}".format(index))
+        child_end = _find_close(data, index)
+        keyword = _KEYWORD_RE.match(data, index).group(1)
+        yield keyword, index, child_end
+        pos = child_end
+
+def _atoms(data, start, end):
+    """
+    Return the atoms (non parenthesized values) that follow the keyword of
+    the s-expression `data[start:end]`, up to its first child.
+    """
+    pos = _KEYWORD_RE.match(data, start).end()
+    result = []
+    while True:
+        match = _ATOM_RE.match(data, pos, end)
+        if not match:
+            return result
+        result.append(match.group(1).strip(b'"').decode("utf-8"))
+        pos = match.end()
+
+def _find_child(data, start, end, keyword):
+    for (child_kw, child_start, child_end) in _iter_children(data, start, end):
+        if child_kw == keyword:
+            return (child_start, child_end)
+    return None
+
+def _parse_pos(data, span):
+    values = [float(v) for v in _atoms(data, span[0], span[1])]
+    if len(values) == 2:
+        values.append(0.0)
+    return pcbnew_obj.Pos(*values[:3])
+
+def _pos_changed(old, new):
+    return (
+        abs(old.x - new.x) > POS_TOLERANCE or
+        abs(old.y - new.y) > POS_TOLERANCE or
+        abs(old.a - new.a) > POS_TOLERANCE
+    )
+
+class _OldModule(object):
+    """ Location of the fields of a footprint in the old file. """
+    def __init__(self, data, start, end):
+        self.start = start
+        self.end = end
+        atoms = _atoms(data, start, end)
+        self.component = atoms[0] if atoms else None
+        self.reference = None
+        self.layer = None
+        self.at_span = None
+        self.pos = pcbnew_obj.Pos()
+        # (at ...) spans of pads and text, they store absolute angles
+        self.child_at_spans = []
+
+        for (keyword, child_start, child_end) in _iter_children(data, start, end):
+            if keyword == b"at":
+                self.at_span = (child_start, child_end)
+                self.pos = _parse_pos(data, self.at_span)
+            elif keyword == b"layer":
+                self.layer = _atoms(data, child_start, child_end)[0]
+            elif keyword in (b"pad", b"fp_text"):
+                if keyword == b"fp_text":
+                    text_atoms = _atoms(data, child_start, child_end)
+                    if text_atoms[0] == "reference":
+                        self.reference = text_atoms[1]
+                at_span = _find_child(data, child_start, child_end, b"at")
+                if at_span:
+                    self.child_at_spans.append(at_span)
+
+class _OldLine(object):
+    """ Location of a drawing on the `Edge.Cuts` layer in the old file. """
+    def __init__(self, data, keyword, start, end):
+        self.keyword = keyword.decode("utf-8")
+        self.start = start
+        self.end = end
+        self.points = []
+        for (child_kw, child_start, child_end) in _iter_children(data, start, end):
+            if child_kw in (b"start", b"end") or \
+                    (child_kw == b"angle" and keyword == b"gr_arc"):
+                self.points += [float(v) for v in _atoms(data, child_start, child_end)]
+
+    @staticmethod
+    def is_edge_cut(data, start, end):
+        layer_span = _find_child(data, start, end, b"layer")
+        if not layer_span:
+            return False
+        return _atoms(data, *layer_span) == [EDGE_CUTS_LAYER]
+
+    def matches(self, obj):
+        if self.keyword != obj._keyword:
+            return False
+        new_points = [obj.start.x, obj.start.y, obj.end.x, obj.end.y]
+        if hasattr(obj, "angle"):
+            new_points.append(obj.angle)
+        if len(new_points) != len(self.points):
+            return False
+        for (old, new) in zip(self.points, new_points):
+            if abs(old - new) > POS_TOLERANCE:
+                return False
+        return True
+
+class PCBUpdater(object):
+    """
+    Computes the byte ranges of an existing board that need to change to
+    match a newly generated `PCBDocument`.
+    """
+
+    def __init__(self, data, pcb):
+        self.data = data
+        self.pcb = pcb
+        self.patches = []
+
+        self.root_start = data.index(b'(')
+        self.root_end = _find_close(data, self.root_start)
+
+        self.old_modules = {}
+        self.old_edge_cuts = []
+        for (keyword, start, end) in _iter_children(data, self.root_start, self.root_end):
+            if keyword == b"module":
+                module = _OldModule(data, start, end)
+                if module.reference != None:
+                    self.old_modules[module.reference] = module
+            elif keyword in (b"gr_line", b"gr_arc"):
+                if _OldLine.is_edge_cut(data, start, end):
+                    self.old_edge_cuts.append(_OldLine(data, keyword, start, end))
+
+    def _patch(self, start, end, text):
+        self.patches.append((start, end, text.encode("utf-8")))
+
+    def _update_module(self, old, new):
+        if old.component != str(new.component) or old.layer != new.layer or \
+                old.at_span == None:
+            # Flipped or swapped footprints can't be patched in place
+            print("Warning: replacing footprint '{}', its pad nets need to be "
+                  "updated from the netlist".format(old.reference), file=sys.stderr)
+            self._patch(old.start, old.end, new.generate(indent_depth=1).lstrip())
+            return
+
+        if not _pos_changed(old.pos, new.pos):
+            return
+
+        self._patch(old.at_span[0], old.at_span[1], new.pos.generate())
+
+        angle_adj = new.pos.a - old.pos.a
+        if abs(angle_adj) <= POS_TOLERANCE:
+            return
+        for span in old.child_at_spans:
+            child_pos = _parse_pos(self.data, span)
+            child_pos.a += angle_adj
+            self._patch(span[0], span[1], child_pos.generate())
+
+    def _update_edge_cuts(self, new_lines):
+        old_lines = self.old_edge_cuts
+        if len(old_lines) == len(new_lines):
+            for (old, new) in zip(old_lines, new_lines):
+                if not old.matches(new):
+                    self._patch(old.start, old.end, new.generate())
+            return
+
+        # The outline has a different number of segments, so replace it
+        if old_lines:
+            insert_pos = old_lines[0].start
+        else:
+            insert_pos = self.root_end - 1
+        for (i, old) in enumerate(old_lines):
+            start = old.start
+            if i != 0:
+                # remove the whole line, so no blank lines are left behind
+                while start > 0 and self.data[start-1:start] in b" \t\r\n":
+                    start -= 1
+            self._patch(start, old.end, "")
+        text = "\n  ".join(line.generate() for line in new_lines)
+        if not old_lines:
+            text = "  " + text + "\n"
+        self._patch(insert_pos, insert_pos, text)
+
+    def compute_patches(self):
+        new_modules = []
+        new_edge_cuts = []
+        for obj in self.pcb.objects:
+            if isinstance(obj, pcbnew_obj.Module):
+                new_modules.append(obj)
+            elif isinstance(obj, pcbnew_obj.LineCommon) and \
+                    obj.layer == EDGE_CUTS_LAYER:
+                new_edge_cuts.append(obj)
+
+        self._update_edge_cuts(new_edge_cuts)
+
+        seen_refs = set()
+        added_modules = []
+        for module in new_modules:
+            ref = module.get_reference()
+            seen_refs.add(ref)
+            if ref in self.old_modules:
+                self._update_module(self.old_modules[ref], module)
+            else:
+                added_modules.append(module)
+
+        if added_modules:
+            insert_pos = self.root_end - 1
+            text = "".join(module.generate(indent_depth=1) for module in added_modules)
+            self._patch(insert_pos, insert_pos, text + "\n")
+
+        new_components = set(str(module.component) for module in new_modules)
+        for (ref, old) in self.old_modules.items():
+            if ref not in seen_refs and old.component in new_components:
+                print("Warning: footprint '{}' is no longer in the layout, "
+                      "it was left on the board".format(ref), file=sys.stderr)
+
+        self.patches.sort(key=lambda patch: (patch[0], patch[1]))
+        return self.patches
+
+    def write(self, out_file):
+        """ Write the old file with all patches applied to `out_file`. """
+        pos = 0
+        for (start, end, text) in self.patches:
+            out_file.write(self.data[pos:start])
+            out_file.write(text)
+            pos = end
+        out_file.write(self.data[pos:])
+
+def update_file(file_name, pcb):
+    """
+    Update the board in `file_name` in place so that it matches `pcb`.
+    Returns the number of patched regions.
+    """
+    with open(file_name, "rb") as in_file:
+        data = in_file.read()
+
+    updater = PCBUpdater(data, pcb)
+    patches = updater.compute_patches()
+    if not patches:
+        return 0
+
+    tmp_name = file_name + ".tmp"
+    with open(tmp_name, "wb") as out_file:
+        updater.write(out_file)
+    os.replace(tmp_name, file_name)
+    return len(patches)
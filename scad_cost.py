@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Estimate how expensive a SolidPython tree is to render with CGAL.
+
+The estimate is a rough model, meant to compare layouts and catch outputs
+that will take far longer than usual before OpenSCAD is run:
+
+* every primitive gets a facet count from its size and `$fn`, using the
+  same rules as OpenSCAD for the number of fragments of a circle,
+* 2D shapes are counted by their edges and turned into facets when they
+  are extruded,
+* a union or difference of `n` operands is done one operand at a time, so
+  each step costs the facets of the result so far plus the next operand,
+* a minkowski sum costs the product of the facets of its operands.
+
+Calls to modules and `for` loops are expanded, so a loop over 80 switch
+holes costs 80 switch holes.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+
+# OpenSCAD defaults for $fa and $fs
+DEFAULT_FA = 12.0
+DEFAULT_FS = 2.0
+
+PRIMITIVES_2D = ('square', 'circle', 'polygon', 'text')
+BOOLEANS = ('union', 'difference', 'intersection')
+
+def fragments(r, fn=0):
+    """ Number of segments OpenSCAD uses for a circle of radius `r` """
+    if fn and fn > 0:
+        return max(int(fn), 3)
+    if r < 1e-9:
+        return 3
+    return int(math.ceil(max(min(360.0 / DEFAULT_FA, r * 2 * math.pi / DEFAULT_FS), 5)))
+
+def _param(obj, name, default=None):
+    value = obj.params.get(name)
+    return default if value is None else value
+
+def _fn(obj):
+    # SolidPython renames `segments` to `$fn` while rendering
+    return int(_param(obj, 'segments', _param(obj, '$fn', 0)))
+
+def _radius(obj):
+    radii = [_param(obj, name) for name in ('r', 'r1', 'r2') if _param(obj, name)]
+    if radii:
+        return max(radii)
+    diameters = [_param(obj, name) for name in ('d', 'd1', 'd2') if _param(obj, name)]
+    if diameters:
+        return max(diameters) / 2
+    return 1.0
+
+class RenderCost(object):
+    """
+    The result of `estimate_cost()`. `facets` is the estimated size of the
+    rendered object and `cost` the estimated work for CGAL, in facets
+    processed.
+    """
+    def __init__(self):
+        self.node_counts = {}
+        self.facets = 0
+        self.cost = 0
+        self.max_depth = 0
+        self.max_operands = 0
+        self.minkowski = 0
+        self.hull = 0
+
+    def __str__(self):
+        lines = [
+            "estimated cost: {:,.0f}".format(self.cost),
+            "estimated facets: {:,.0f}".format(self.facets),
+            "boolean depth: {}, most operands: {}".format(
+                self.max_depth, self.max_operands
+            ),
+            "minkowski: {}, hull: {}".format(self.minkowski, self.hull),
+            "nodes: " + ", ".join(
+                "{} {}".format(name, count)
+                for (name, count) in sorted(self.node_counts.items())
+            ),
+        ]
+        return "\n".join(lines)
+
+class _Estimator(object):
+    def __init__(self, result, modules):
+        self.result = result
+        self.modules = modules
+        self._module_cost = {}
+
+    def visit(self, obj, flat=False, depth=0):
+        """
+        Returns `(size, cost)` of `obj`, where size is the number of edges
+        for 2D objects and the number of facets for 3D objects.
+        """
+        name = obj.name
+        counts = self.result.node_counts
+        counts[name] = counts.get(name, 0) + 1
+
+        if name in self.modules and not obj.children:
+            return self.visit_module(name, flat, depth)
+
+        if name in ('linear_extrude', 'rotate_extrude'):
+            (edges, cost) = self.visit_children(obj, True, depth)
+            if name == 'linear_extrude':
+                slices = max(1, _param(obj, 'slices', 1))
+                return (edges * slices + 2, cost)
+            return (edges * fragments(10.0, _fn(obj)), cost)
+
+        if name in PRIMITIVES_2D:
+            if name == 'square':
+                return (4, 0)
+            if name == 'circle':
+                return (fragments(_radius(obj), _fn(obj)), 0)
+            if name == 'polygon':
+                return (len(_param(obj, 'points', [])), 0)
+            return (100, 0)
+
+        if name == 'cube':
+            return (6, 0)
+        if name == 'cylinder':
+            return (fragments(_radius(obj), _fn(obj)) + 2, 0)
+        if name == 'sphere':
+            n = fragments(_radius(obj), _fn(obj))
+            return (n * ((n + 1) // 2), 0)
+        if name == 'polyhedron':
+            return (len(_param(obj, 'faces', [])), 0)
+
+        if name == 'for':
+            count = len(_param(obj, 'p', []))
+            (size, cost) = self.visit_children(obj, flat, depth)
+            # the loop is an implicit union of all iterations
+            return (size * count, cost * count + self.sequential_cost([size] * count, flat, depth))
+
+        if name in BOOLEANS:
+            return self.visit_children(obj, flat, depth + 1)
+
+        if name == 'minkowski':
+            self.result.minkowski += 1
+            sizes = []
+            cost = 0
+            for child in obj.children:
+                (size, child_cost) = self.visit(child, flat, depth + 1)
+                sizes.append(size)
+                cost += child_cost
+            product = 1
+            for size in sizes:
+                product *= max(size, 1)
+            return (product, cost + (0 if flat else product))
+
+        if name == 'hull':
+            self.result.hull += 1
+            (size, cost) = self.visit_children(obj, flat, depth)
+            return (size, cost + (0 if flat else size))
+
+        (size, cost) = self.visit_children(obj, flat, depth)
+        if flat and obj.params and hasattr(obj, 'include_string'):
+            # offsets from scad-utils round every corner
+            size *= 1 + fragments(_radius(obj), _fn(obj)) // 4
+        return (size, cost)
+
+    def visit_children(self, obj, flat, depth):
+        sizes = []
+        cost = 0
+        for child in obj.children:
+            (child_size, child_cost) = self.visit(child, flat, depth)
+            sizes.append(child_size)
+            cost += child_cost
+        # several children are an implicit union
+        return (sum(sizes), cost + self.sequential_cost(sizes, flat, depth))
+
+    def visit_module(self, name, flat, depth):
+        key = (name, flat)
+        if key not in self._module_cost:
+            self._module_cost[key] = self.visit(self.modules[name], flat, depth)
+        return self._module_cost[key]
+
+    def sequential_cost(self, sizes, flat, depth):
+        if len(sizes) < 2:
+            return 0
+        self.result.max_depth = max(self.result.max_depth, depth)
+        self.result.max_operands = max(self.result.max_operands, len(sizes))
+        if flat:
+            # 2D booleans are cheap compared to CGAL
+            return 0
+        cost = 0
+        total = 0
+        for size in sizes:
+            total += size
+            cost += total
+        return cost
+
+def estimate_cost(obj, modules=None):
+    """
+    Returns a `RenderCost` for the SolidPython object `obj`. `modules` maps
+    the names of OpenSCAD modules called in the tree to their bodies.
+    """
+    result = RenderCost()
+    (result.facets, result.cost) = _Estimator(result, modules or {}).visit(obj)
+    return result
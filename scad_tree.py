@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Simplify a SolidPython object tree before it is written to a .scad file.
+
+The builders in plate.py produce a lot of nodes that don't change the
+result, like `translate([0, 0, 0])`, chains of transforms around a single
+object and `render()` around every hole. `optimize()` returns an equivalent
+tree where:
+
+* consecutive transforms are folded into a single `multmatrix()`, or a
+  `translate()` if they only move the object,
+* identity transforms and `render()` are removed,
+* nested unions are flattened,
+* nested differences are flattened, and all the subtracted objects are
+  grouped in one union, so CGAL does a single large difference.
+
+Nodes with modifiers, holes, parts and nodes with parameters that aren't
+plain numbers, like the loop variables in a `for`, are left as they are.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import copy
+import math
+import numpy as np
+
+from solid import multmatrix, translate, union
+
+TRANSFORMS = ('translate', 'rotate', 'mirror', 'scale', 'multmatrix')
+
+EPSILON = 1e-12
+
+def _is_plain(obj):
+    return obj.modifier == "" and not obj.is_hole and not obj.is_part_root and \
+        type(obj).__name__ != 'IncludedOpenSCADObject'
+
+def _vector(value, length=3, fill=0.0):
+    if np.isscalar(value):
+        value = [value] * length
+    result = np.full(length, fill)
+    value = np.asarray(value, dtype=float)
+    result[:len(value)] = value
+    return result
+
+def _axis_rotation(axis, angle):
+    """ Rotation of `angle` degrees about the unit vector `axis` """
+    (x, y, z) = axis
+    c = math.cos(math.radians(angle))
+    s = math.sin(math.radians(angle))
+    t = 1 - c
+    return np.array([
+        [t*x*x + c,   t*x*y - s*z, t*x*z + s*y],
+        [t*x*y + s*z, t*y*y + c,   t*y*z - s*x],
+        [t*x*z - s*y, t*y*z + s*x, t*z*z + c],
+    ])
+
+def transform_matrix(obj):
+    """
+    Returns the 4x4 matrix of a transform node, or None if its parameters
+    aren't plain numbers.
+    """
+    params = obj.params
+    result = np.identity(4)
+    try:
+        if obj.name == 'translate':
+            result[:3, 3] = _vector(params.get('v'))
+        elif obj.name == 'scale':
+            result[:3, :3] = np.diag(_vector(params.get('v'), fill=1.0))
+        elif obj.name == 'mirror':
+            normal = _vector(params.get('v'))
+            length = np.linalg.norm(normal)
+            if length < EPSILON:
+                return result
+            normal /= length
+            result[:3, :3] -= 2 * np.outer(normal, normal)
+        elif obj.name == 'rotate':
+            a = params.get('a')
+            v = params.get('v')
+            if a == None:
+                return result
+            if np.isscalar(a):
+                if v == None:
+                    v = [0, 0, 1]
+                axis = _vector(v)
+                length = np.linalg.norm(axis)
+                if length < EPSILON:
+                    return result
+                result[:3, :3] = _axis_rotation(axis / length, float(a))
+            else:
+                # OpenSCAD rotates about x, then y, then z
+                (ax, ay, az) = _vector(a)
+                result[:3, :3] = _axis_rotation([0, 0, 1], az).dot(
+                    _axis_rotation([0, 1, 0], ay)).dot(
+                    _axis_rotation([1, 0, 0], ax))
+        elif obj.name == 'multmatrix':
+            m = np.asarray(params.get('m'), dtype=float)
+            result[:m.shape[0], :m.shape[1]] = m
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+    return result
+
+def _clean(value):
+    value = float(value)
+    return 0.0 if abs(value) < EPSILON else value
+
+def _transform_node(matrix):
+    if np.allclose(matrix[:3, :3], np.identity(3), rtol=0, atol=EPSILON):
+        return translate([_clean(x) for x in matrix[:3, 3]])
+    return multmatrix([[_clean(x) for x in row] for row in matrix])
+
+def _copy_with_children(obj, children):
+    result = copy.copy(obj)
+    result.params = dict(obj.params)
+    result.children = []
+    result.add(children)
+    return result
+
+def _as_union(children):
+    if len(children) == 1:
+        return children[0]
+    return union()(children)
+
+def _flatten_unions(children):
+    result = []
+    for child in children:
+        if child.name == 'union' and _is_plain(child):
+            result += child.children
+        else:
+            result.append(child)
+    return result
+
+def _optimize_transform(obj, children):
+    matrix = transform_matrix(obj)
+    if matrix is None:
+        return _copy_with_children(obj, children)
+
+    folded = False
+    if len(children) == 1 and children[0].name in TRANSFORMS and _is_plain(children[0]):
+        child_matrix = transform_matrix(children[0])
+        if child_matrix is not None:
+            matrix = matrix.dot(child_matrix)
+            children = children[0].children
+            folded = True
+
+    if np.allclose(matrix, np.identity(4), rtol=0, atol=EPSILON):
+        return _as_union(children)
+    if folded:
+        return _transform_node(matrix)(children)
+    return _copy_with_children(obj, children)
+
+def _optimize_difference(obj, children):
+    if not children:
+        return _copy_with_children(obj, children)
+    first = children[0]
+    subtract = children[1:]
+    # (a - b) - c = a - (b + c)
+    while first.name == 'difference' and _is_plain(first) and first.children:
+        subtract = first.children[1:] + subtract
+        first = first.children[0]
+    subtract = _flatten_unions(subtract)
+    if not subtract:
+        return first
+    if len(subtract) > 1:
+        subtract = [union()(subtract)]
+    return _copy_with_children(obj, [first] + subtract)
+
+def optimize(obj, _memo=None):
+    """ Returns an optimized copy of the SolidPython object `obj` """
+    if _memo == None:
+        _memo = {}
+    if id(obj) in _memo:
+        return _memo[id(obj)]
+
+    children = [optimize(child, _memo) for child in obj.children]
+    if not _is_plain(obj):
+        result = _copy_with_children(obj, children)
+    elif obj.name == 'render':
+        result = _as_union(children) if children else _copy_with_children(obj, children)
+    elif obj.name in TRANSFORMS:
+        result = _optimize_transform(obj, children)
+    elif obj.name == 'union':
+        children = _flatten_unions(children)
+        result = _as_union(children) if children else _copy_with_children(obj, children)
+    elif obj.name == 'difference':
+        result = _optimize_difference(obj, children)
+    else:
+        result = _copy_with_children(obj, children)
+
+    _memo[id(obj)] = result
+    return result
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Write SolidPython objects to OpenSCAD files.
+
+SolidPython renders a tree by building the text of every subtree and
+re-indenting it at each level above, so the whole file is copied once per
+level of nesting and held in memory. `ScadWriter` walks the tree once and
+streams each line straight to the file. Numbers are written with a fixed
+number of decimals, without trailing zeros.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import keyword
+import numbers
+
+from solid.solidpython import OpenSCADObject, IncludedOpenSCADObject
+
+DEFAULT_PRECISION = 6
+
+# SolidPython objects that only group their children
+NON_RENDERED = ('part', 'hole')
+
+def _param_name(name):
+    # SolidPython adds an underscore to python keywords, like `or_`
+    if name.endswith("_") and keyword.iskeyword(name[:-1]):
+        return name[:-1]
+    if name == 'segments':
+        return '$fn'
+    return name
+
+class ScadWriter(object):
+    def __init__(self, out, precision=DEFAULT_PRECISION):
+        self.out = out
+        self.precision = precision
+        self._float_format = "{{:.{}f}}".format(precision)
+
+    def format_number(self, value):
+        text = self._float_format.format(value)
+        if '.' in text:
+            text = text.rstrip('0').rstrip('.')
+        if text == '-0':
+            text = '0'
+        return text
+
+    def format_value(self, value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, numbers.Integral):
+            return str(int(value))
+        if isinstance(value, numbers.Real):
+            return self.format_number(value)
+        if isinstance(value, str):
+            return '"{}"'.format(value)
+        if isinstance(value, OpenSCADObject):
+            return self.render_str(value).strip().rstrip(';')
+        if hasattr(value, '__iter__'):
+            return "[" + ", ".join(self.format_value(item) for item in value) + "]"
+        return str(value)
+
+    def format_call(self, obj):
+        params = obj.params
+        positional = sorted(k for k in params if isinstance(k, int))
+        named = sorted(
+            (_param_name(k), params[k]) for k in params if not isinstance(k, int)
+        )
+        args = [
+            self.format_value(params[k]) for k in positional
+            if params[k] is not None
+        ]
+        args += [
+            "{} = {}".format(name, self.format_value(value))
+            for (name, value) in named if value is not None
+        ]
+        return "{}{}({})".format(obj.modifier, obj.name, ", ".join(args))
+
+    def write_tree(self, obj, depth=0):
+        """ Write the object `obj` and its children """
+        # (object, depth, closing) entries, with closing set for the '}'
+        # written after the children of an object
+        stack = [(obj, depth, False)]
+        while stack:
+            (node, level, closing) = stack.pop()
+            if closing:
+                self.out.write("\t" * level + "}\n")
+                continue
+            if node.is_hole:
+                raise ValueError("hole() objects are not supported")
+            if node.name in NON_RENDERED:
+                stack += [(child, level, False) for child in reversed(node.children)]
+                continue
+            if not node.children:
+                self.out.write("\t" * level + self.format_call(node) + ";\n")
+                continue
+            self.out.write("\t" * level + self.format_call(node) + " {\n")
+            stack.append((node, level, True))
+            stack += [(child, level+1, False) for child in reversed(node.children)]
+
+    def write_module(self, name, obj):
+        """ Write `obj` as the body of the OpenSCAD module `name` """
+        self.out.write("module {}() {{\n".format(name))
+        self.write_tree(obj, 1)
+        self.out.write("}\n")
+
+    def render_str(self, obj):
+        """ Returns the text of `obj` as a string """
+        out = self.out
+        try:
+            self.out = io.StringIO()
+            self.write_tree(obj)
+            return self.out.getvalue()
+        finally:
+            self.out = out
+
+def find_includes(obj):
+    """ Returns the sorted `use`/`include` lines needed by the tree `obj` """
+    result = set()
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, IncludedOpenSCADObject):
+            result.add(node.include_string)
+        stack += node.children
+        stack += [p for p in node.params.values() if isinstance(p, OpenSCADObject)]
+    return sorted(result)
+
+def write_file(obj, file_name, header="", precision=DEFAULT_PRECISION):
+    """
+    Write the object `obj` to the file `file_name`. `header` is written
+    before it, followed by the files used by `obj` that the header doesn't
+    already use.
+    """
+    header_lines = set(header.splitlines(True))
+    with open(file_name, "w", encoding="utf-8") as out_file:
+        out_file.write(header)
+        for line in find_includes(obj):
+            if line not in header_lines:
+                out_file.write(line)
+        out_file.write("\n")
+        ScadWriter(out_file, precision).write_tree(obj)
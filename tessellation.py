@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Pick the number of segments for curved features.
+
+The number of segments of a circle is chosen so the distance between the
+true circle and its polygon, the chord error, stays under a tolerance. A
+small screw hole then gets a few segments and a large fillet gets many.
+
+The counts are decided when they are first written out, after every
+feature has asked for one. If the facets of all curved features would be
+over the facet cap, the tolerance is loosened until they fit.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+
+DEFAULT_CHORD_TOLERANCE = 0.05
+MIN_SEGMENTS = 8
+
+def segments_for_radius(radius, tolerance, min_segments=MIN_SEGMENTS, max_segments=None):
+    """
+    Returns the number of segments needed to draw a circle of `radius` with
+    a chord error of at most `tolerance`. The result is a multiple of 4, so
+    circles stay symmetric about the x and y axes.
+    """
+    if radius <= tolerance / 2:
+        segments = min_segments
+    else:
+        segments = math.ceil(math.pi / math.acos(1 - tolerance / radius))
+        segments = int(math.ceil(segments / 4) * 4)
+    segments = max(segments, min_segments)
+    if max_segments:
+        segments = min(segments, max_segments)
+    return segments
+
+class SegmentCount(object):
+    """
+    The segment count of one feature. It can be used as an OpenSCAD `$fn`
+    value, and is decided by its `TessellationBudget` when it is first read.
+    """
+    def __init__(self, budget, radius):
+        self.budget = budget
+        self.radius = radius
+
+    def __int__(self):
+        return self.budget.get_segments(self.radius)
+    __index__ = __int__
+
+    def __str__(self):
+        return str(int(self))
+
+    def __repr__(self):
+        return "SegmentCount(radius={})".format(self.radius)
+
+class TessellationBudget(object):
+    def __init__(self, tolerance=DEFAULT_CHORD_TOLERANCE, max_segments=None,
+                 max_facets=None, min_segments=MIN_SEGMENTS):
+        self.tolerance = tolerance
+        self.max_segments = max_segments
+        self.max_facets = max_facets
+        self.min_segments = min_segments
+        self.requests = []
+        self.scale = 1.0
+        self._resolved = False
+
+    def segments(self, radius, count=1, sphere=False):
+        """
+        Returns the `SegmentCount` for a curve of `radius`. `count` is how
+        many full circles of this radius the feature draws, for example the
+        number of times it is placed, and is used for the facet cap.
+        """
+        self.requests.append((radius, count, sphere))
+        self._resolved = False
+        return SegmentCount(self, radius)
+
+    def get_segments(self, radius, scale=None):
+        if scale == None:
+            if not self._resolved:
+                self.resolve()
+            scale = self.scale
+        return segments_for_radius(
+            radius, self.tolerance * scale, self.min_segments, self.max_segments
+        )
+
+    def total_facets(self, scale=1.0):
+        total = 0
+        for (radius, count, sphere) in self.requests:
+            segments = self.get_segments(radius, scale)
+            if sphere:
+                total += count * segments * segments // 2
+            else:
+                total += count * segments
+        return total
+
+    def resolve(self):
+        """ Loosen the tolerance until all requests fit under the facet cap """
+        self.scale = 1.0
+        if self.max_facets:
+            # the facets with every curve at the minimum number of segments
+            lowest = self.total_facets(math.inf)
+            while self.total_facets(self.scale) > max(self.max_facets, lowest):
+                self.scale *= 1.25
+        self._resolved = True
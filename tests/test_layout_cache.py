@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import layout_cache
+import plate
+
+ROWS = [[{"a": 7}, "", ""]]
+
+def write_layout(path, rows, options=None):
+    layout = rows
+    if options != None:
+        layout = {"options": options, "layout": rows}
+    path.write_text(json.dumps(layout))
+
+def test_cache_reused_for_unchanged_file(tmp_path):
+    layout_file = tmp_path / "keys.json"
+    cache_file = str(tmp_path / "keys.layout-cache")
+    write_layout(layout_file, ROWS)
+
+    layout = layout_cache.load_layout(str(layout_file), cache_file)
+    assert layout.changed
+    layout.get_keyboard(19.0)
+    layout_cache.save_layout(layout, cache_file)
+    assert os.path.exists(cache_file)
+
+    cached = layout_cache.load_layout(str(layout_file), cache_file)
+    assert not cached.changed
+    assert cached.keyboard != None
+    assert cached.get_keyboard(19.0) is cached.keyboard
+    assert len(list(cached.keyboard.get_keys())) == 2
+
+def test_cache_rebuilt_when_file_changes(tmp_path):
+    layout_file = tmp_path / "keys.json"
+    cache_file = str(tmp_path / "keys.layout-cache")
+    write_layout(layout_file, ROWS)
+    layout = layout_cache.load_layout(str(layout_file), cache_file)
+    layout.get_keyboard(19.0)
+    layout_cache.save_layout(layout, cache_file)
+
+    write_layout(layout_file, [[{"a": 7}, "", "", ""]])
+    changed = layout_cache.load_layout(str(layout_file), cache_file)
+    assert changed.changed
+    assert changed.keyboard == None
+    assert len(list(changed.get_keyboard(19.0).get_keys())) == 3
+
+def test_command_line_overrides_layout_options(tmp_path, monkeypatch):
+    layout_file = tmp_path / "keys.json"
+    write_layout(layout_file, ROWS, options={"only": "lid"})
+    build_dir = tmp_path / "build" / "keys"
+    monkeypatch.chdir(tmp_path)
+
+    monkeypatch.setattr(sys, "argv", ["plate.py", str(layout_file)])
+    plate.main()
+    assert sorted(os.listdir(str(build_dir))) == [
+        "keys-lid.scad", "keys.layout-cache"
+    ]
+
+    os.remove(str(build_dir / "keys-lid.scad"))
+    monkeypatch.setattr(sys, "argv", [
+        "plate.py", str(layout_file), "--only", "pcb"
+    ])
+    plate.main()
+    assert sorted(os.listdir(str(build_dir))) == [
+        "keys-pcb.kicad_pcb", "keys-pcb.pos", "keys.layout-cache"
+    ]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import difflib
+import json
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import plate
+
+ROWS = [[{"a": 7}, "", ""], ["", ""]]
+# the second key of the first row moved right by half a unit
+MOVED_ROWS = [[{"a": 7}, "", {"x": 0.5}, ""], ["", ""]]
+
+SEGMENT = b"  (segment (start 9.5 9.5) (end 28.5 9.5) (width 0.25) (layer B.Cu) (net 0))\n"
+
+def run_plate(tmp_path, monkeypatch, rows, *args):
+    layout_file = tmp_path / "keys.json"
+    layout_file.write_text(json.dumps(rows))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", [
+        "plate.py", str(layout_file), "--only", "pcb"
+    ] + list(args))
+    plate.main()
+    return tmp_path / "build" / "keys" / "keys-pcb.kicad_pcb"
+
+def add_segment(pcb_file):
+    """ Add a hand routed track to the end of the board """
+    data = pcb_file.read_bytes()
+    end = data.rindex(b")")
+    data = data[:end] + SEGMENT + data[end:]
+    pcb_file.write_bytes(data)
+    return data
+
+def test_update_keeps_routing(tmp_path, monkeypatch):
+    pcb_file = run_plate(tmp_path, monkeypatch, ROWS)
+    old = add_segment(pcb_file)
+
+    run_plate(tmp_path, monkeypatch, MOVED_ROWS, "--pcb-update", "1")
+    new = pcb_file.read_bytes()
+
+    assert new.count(SEGMENT) == 1
+    assert new[new.index(SEGMENT):] == old[old.index(SEGMENT):]
+
+    changed = [
+        line for line in difflib.unified_diff(
+            old.decode("utf-8").splitlines(), new.decode("utf-8").splitlines(),
+            lineterm="", n=0
+        )
+        if line[:1] in "+-" and line[:3] not in ("+++", "---")
+    ]
+    assert changed
+    moved = [line for line in changed if "(module" in line]
+    assert len(moved) == 2
+    assert moved[0].startswith("-") and "(at 28.5 9.5)" in moved[0]
+    assert moved[1].startswith("+") and "(at 38 9.5)" in moved[1]
+    for line in changed:
+        assert line in moved or "(layer Edge.Cuts)" in line
+
+def test_update_without_changes_keeps_file(tmp_path, monkeypatch):
+    pcb_file = run_plate(tmp_path, monkeypatch, ROWS)
+    old = add_segment(pcb_file)
+
+    run_plate(tmp_path, monkeypatch, ROWS, "--pcb-update", "1")
+    assert pcb_file.read_bytes() == old
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import copy
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from pykicad import pcbnew_obj
+
+FOOTPRINT_FILE = os.path.join(
+    REPO_DIR, "mx.pretty", "Cherry_MX_Matias_u1_NoSilk_Back.kicad_mod"
+)
+
+def load_footprint():
+    return pcbnew_obj.Module.from_file(FOOTPRINT_FILE)
+
+def pads(module):
+    return [obj for obj in module.objects if type(obj) == pcbnew_obj.Pad]
+
+def test_flipped_variant_follows_add_object():
+    module = load_footprint()
+    pad_count = len(pads(module))
+    module.place(0, 0, flip=True)
+
+    module.add_object(copy.deepcopy(pads(module)[0]))
+    front = module.place(0, 0, flip=False)
+    back = module.place(0, 0, flip=True)
+    assert len(front.objects) == len(module.objects)
+    assert len(back.objects) == len(module.objects)
+    assert len(pads(back)) == pad_count + 1
+    assert back.layer != front.layer
+
+def test_flipped_variant_follows_instance_objects():
+    instance = load_footprint().place(0, 0)
+    # edit the instance so it is placed from its own objects
+    instance.objects = instance.objects[:-1]
+    instance.place(0, 0, flip=True)
+
+    instance.objects = instance.objects[:-1]
+    back = instance.place(0, 0, flip=True)
+    assert len(back.objects) == len(instance.objects)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import plate
+
+# modules that are only imported by the stages that use them
+DEFERRED_MODULES = [
+    "solid",
+    "case_builder",
+    "scad_tree",
+    "scad_writer",
+    "scad_cost",
+    "pyparsing",
+    "scipy.spatial",
+    "pykicad.pcbnew_parser",
+    "pykicad.pcbnew_update",
+]
+
+def test_import_defers_slow_modules():
+    # a fresh interpreter, as other tests may have loaded them already
+    code = (
+        "import sys\n"
+        "sys.path.insert(0, {!r})\n"
+        "import plate\n"
+        "for name in {!r}:\n"
+        "    if name in sys.modules:\n"
+        "        print(name)\n"
+    ).format(REPO_DIR, DEFERRED_MODULES)
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=REPO_DIR)
+    assert output.decode("utf-8").split() == []
+
+# the most time in seconds the imports of a pcb only run may take. About
+# 0.2 s here, the limit is loose enough for a slow CI machine.
+STARTUP_LIMIT = 2.0
+
+def test_startup_time(tmp_path):
+    layout = os.path.join(REPO_DIR, "layouts", "numpad.json")
+    # a fresh interpreter, as the imports are already loaded in this one
+    output = subprocess.check_output([
+        sys.executable, os.path.join(REPO_DIR, "plate.py"), layout,
+        "--timing", "1", "--only", "pcb"
+    ], cwd=str(tmp_path), stderr=subprocess.DEVNULL)
+    stages = dict(
+        line.strip().split(":")
+        for line in output.decode("utf-8").split("Time per stage:")[1].splitlines()
+        if line.strip()
+    )
+    assert float(stages["startup"].split()[0]) < STARTUP_LIMIT
+
+def test_timing_only_pcb(tmp_path, monkeypatch, capsys):
+    layout = os.path.join(REPO_DIR, "layouts", "numpad.json")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", [
+        "plate.py", layout, "--timing", "1", "--only", "pcb"
+    ])
+    plate.main()
+
+    output = capsys.readouterr().out
+    assert "Time per stage:" in output
+    stages = [
+        line.split(":")[0].strip()
+        for line in output.split("Time per stage:")[1].splitlines()
+        if line.strip()
+    ]
+    assert stages == [
+        "startup", "load layout", "parse keys", "pcb setup", "outline",
+        "keys", "features", "checks", "write pcb", "total",
+    ]
+    build_dir = tmp_path / "build" / "numpad"
+    assert (build_dir / "numpad-pcb.kicad_pcb").exists()
+    assert not (build_dir / "numpad-case.scad").exists()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017 jem@seethis.link
+# Licensed under the MIT license (http://opensource.org/licenses/MIT)
+
+"""
+Find thin walls in the top plate.
+
+The case outline and the outlines of the holes cut into the plate are
+sampled into points, and the distances between the boundaries are found with
+KD-tree queries. The result is accurate to about half the sample spacing.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+import numpy as np
+
+import collision
+
+OUTLINE_OWNER = -1
+
+class ThinWall(object):
+    def __init__(self, name_a, name_b, thickness, pos):
+        self.name_a = name_a
+        self.name_b = name_b
+        self.thickness = thickness
+        self.pos = pos
+
+    def __str__(self):
+        if self.thickness <= 0:
+            return "{} breaks through {} at ({:.2f}, {:.2f})".format(
+                self.name_b, self.name_a, self.pos[0], self.pos[1]
+            )
+        return "wall between {} and {} is {:.2f}mm thick at ({:.2f}, {:.2f})".format(
+            self.name_a, self.name_b, self.thickness, self.pos[0], self.pos[1]
+        )
+
+def sample_path(points, step):
+    """ Sample the closed path `points` with a spacing of at most `step`. """
+    points = np.asarray(points, dtype=float)
+    starts = points
+    ends = np.roll(points, -1, axis=0)
+    result = []
+    for (start, end) in zip(starts, ends):
+        n = max(1, int(math.ceil(np.linalg.norm(end - start) / step)))
+        t = np.arange(n)[:, np.newaxis] / n
+        result.append(start + t * (end - start))
+    return np.concatenate(result)
+
+def sample_shape(shape, step):
+    if isinstance(shape, collision.Circle):
+        n = max(8, int(math.ceil(2 * math.pi * shape.radius / step)))
+        theta = np.linspace(0, 2 * math.pi, n, endpoint=False)
+        return shape.center + shape.radius * np.stack(
+            [np.cos(theta), np.sin(theta)], axis=-1
+        )
+    return sample_path(shape.points, step)
+
+def path_area(path):
+    """ Signed area of a closed path, positive for counter-clockwise paths """
+    path = np.asarray(path, dtype=float)
+    x = path[:, 0]
+    y = path[:, 1]
+    return 0.5 * np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)
+
+def points_in_path(points, path):
+    """ Even-odd rule point in polygon test for many points at once """
+    path = np.asarray(path, dtype=float)
+    x = points[:, 0, np.newaxis]
+    y = points[:, 1, np.newaxis]
+    x0 = path[:, 0]
+    y0 = path[:, 1]
+    x1 = np.roll(x0, -1)
+    y1 = np.roll(y0, -1)
+    crosses = (y0 > y) != (y1 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    return np.sum(crosses & (x < x_cross), axis=1) % 2 == 1
+
+def _groups_intersect(shapes_a, shapes_b):
+    for a in shapes_a:
+        for b in shapes_b:
+            if collision.shapes_intersect(a, b):
+                return True
+    return False
+
+def find_thin_walls(outline, holes, min_wall, step=None):
+    """
+    Returns a list of `ThinWall` for every pair of boundaries that are closer
+    than `min_wall`.
+
+    `outline` is the closed path of the outside of the plate, and `holes` is
+    a list of `(name, shapes, can_cross)` where `shapes` is a list of
+    `collision` shapes that together make up one hole. Holes that overlap
+    each other are ignored. Holes that cut through the outline are reported
+    with a thickness of 0, unless `can_cross` is set like for ports.
+    """
+    if step == None:
+        step = min(min_wall / 4, 0.25)
+
+    samples = [sample_path(outline, step)]
+    owners = [np.full(len(samples[0]), OUTLINE_OWNER)]
+    crosses_outline = []
+    result = []
+    for (i, (name, shapes, can_cross)) in enumerate(holes):
+        hole_samples = np.concatenate([sample_shape(shape, step) for shape in shapes])
+        samples.append(hole_samples)
+        owners.append(np.full(len(hole_samples), i))
+        outside = ~points_in_path(hole_samples, outline)
+        crosses_outline.append(np.any(outside))
+        if np.any(outside) and not can_cross:
+            result.append(ThinWall(
+                "the case edge", name, 0.0, hole_samples[np.argmax(outside)]
+            ))
+    samples = np.concatenate(samples)
+    owners = np.concatenate(owners)
+
+    from scipy.spatial import cKDTree
+    tree = cKDTree(samples)
+    pairs = tree.query_pairs(min_wall, output_type='ndarray')
+    if len(pairs) == 0:
+        return result
+    # the pair order from the tree isn't stable between runs
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    i, j = pairs[:, 0], pairs[:, 1]
+    mask = owners[i] != owners[j]
+    i, j = i[mask], j[mask]
+    dist = np.linalg.norm(samples[i] - samples[j], axis=1)
+
+    # keep the closest point for each pair of boundaries
+    owner_a = np.minimum(owners[i], owners[j])
+    owner_b = np.maximum(owners[i], owners[j])
+    closest = {}
+    for k in np.argsort(dist, kind='stable'):
+        key = (owner_a[k], owner_b[k])
+        if key not in closest:
+            closest[key] = k
+
+    for ((a, b), k) in sorted(closest.items()):
+        if a == OUTLINE_OWNER:
+            if crosses_outline[b]:
+                continue
+            name_a = "the case edge"
+        else:
+            if _groups_intersect(holes[a][1], holes[b][1]):
+                continue
+            name_a = holes[a][0]
+        result.append(ThinWall(
+            name_a, holes[b][0], dist[k], (samples[i[k]] + samples[j[k]]) / 2
+        ))
+    return result